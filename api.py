@@ -1,171 +1,549 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, Form, Request, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response
+from pydantic import BaseModel
+import asyncio
 import os
+import subprocess
+import threading
 import time
-import shutil
+import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-import google.generativeai as genai
+from typing import List, Optional
 from dotenv import load_dotenv
 
+import gemini_client
+from chunked_upload import UploadError, UploadStore
+from content_hash import file_sha256, hashing_copy
+from encoder_tuning import TARGET_REALTIME, apply_settings, settings_for_job
+from encoding_profiles import PROFILE_CHOICES, resolve_profile
+from ffmpeg_scheduler import ResourceLimitExceeded, get_scheduler
+from gemini_files import GeminiFileError, get_registry
+from job_ledger import JobRecord, get_ledger
+from job_profiling import JobProfiler, profile_path
+from loudness import LoudnessError, measure_loudness
+from metrics import (
+    BYTES_PROCESSED, CONTENT_TYPE_LATEST, INPUT_SIZE, JOBS_IN_PROGRESS, JOBS_TOTAL,
+    render_latest, stage_timer,
+)
+from renditions import (
+    LadderError, build_ladder_command, build_render_command, load_ladder, master_playlist, master_playlist_path,
+)
+from video_join import JoinError, join_clips
+
 load_dotenv()
 
-# Initialize FastAPI
-app = FastAPI(title="Video Editor API", version="1.0.0")
+METRICS_APP = "api"
+GEMINI_MODEL_NAME = 'gemini-2.0-flash'
+
+
+def warm_up():
+    """Import the Gemini SDK and build the model so the first request doesn't pay for it"""
+    try:
+        with stage_timer(METRICS_APP, "warmup"):
+            gemini_client.get_model(GEMINI_MODEL_NAME)
+    except Exception:
+        # Reported through /readyz; requests will retry the import on demand
+        pass
 
-# Initialize Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-gemini_model = genai.GenerativeModel('gemini-2.0-flash')
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm up in the background so the worker starts serving immediately
+    if os.getenv("WARMUP_ON_STARTUP", "1") == "1":
+        threading.Thread(target=warm_up, daemon=True).start()
+    yield
+
+
+# Initialize FastAPI
+app = FastAPI(title="Video Editor API", version="1.0.0", lifespan=lifespan)
 
 # Create directories
 os.makedirs("temp_videos", exist_ok=True)
+os.makedirs("joined_videos", exist_ok=True)
 
-@app.post("/analyze-video/")
-async def analyze_video(file: UploadFile = File(...)):
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv')
+# Where rendition_command writes the ladder, relative to where the client runs it
+RENDITIONS_DIR = "renditions"
+JOINED_VIDEO_TTL_SECONDS = int(os.getenv("JOINED_VIDEO_TTL_SECONDS", str(24 * 3600)))
+
+upload_store = UploadStore()
+gemini_file_registry = get_registry(METRICS_APP)
+
+
+def purge_joined_videos(ttl=JOINED_VIDEO_TTL_SECONDS):
+    """Remove joined videos older than ttl seconds"""
+    removed = 0
+    now = time.time()
+    for entry in os.scandir("joined_videos"):
+        try:
+            if entry.is_file() and now - entry.stat().st_mtime > ttl:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Removed by another worker
+            continue
+    return removed
+
+
+class UploadInit(BaseModel):
+    filename: str
+    size: int
+
+
+def save_upload(file, temp_input_path, job):
+    """Write the uploaded file to disk, hashing it on the way and recording time and size"""
+    with job.stage("save_upload"):
+        file_size, input_hash = hashing_copy(file.file, temp_input_path)
+    job.set_input(input_hash, file_size)
+    BYTES_PROCESSED.inc(file_size, app=METRICS_APP, stage="save_upload")
+    INPUT_SIZE.observe(file_size, app=METRICS_APP)
+
+
+def generate_ffmpeg_command(temp_input_path, filename, job):
     """
-    Upload a video file and get an FFmpeg command to edit it with stutters and pauses removed
+    Get the video onto Gemini (reusing a live upload of the same content) and return the cleaned FFmpeg command
     """
-    if not file.filename.endswith(('.mp4', '.mov', '.avi', '.mkv')):
-        raise HTTPException(status_code=400, detail="Only video files are supported")
-    
-    # Save uploaded file temporarily
-    temp_input_path = f"temp_videos/{file.filename}"
-    with open(temp_input_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
+    gemini_model = gemini_client.get_model(GEMINI_MODEL_NAME)
+    content_hash = job.input_hash or file_sha256(temp_input_path)
+
+    # Create prompt for Gemini
+    prompt = f"""
+    Analyze this video and provide only an FFmpeg command to improve it by removing stutters, long pauses, and loading times.
+
+    The input video file path is: {temp_input_path}
+
+    Look for issues like:
+    - Stutters or repeated words
+    - Long waiting time for loading screens
+    - Long pauses or dead air
+    - Sections that should be cut out
+
+    Return ONLY the FFmpeg command, nothing else. Use the exact input path provided.
+    Format the output path as: edited_{filename}
+
+    Example format: ffmpeg -i "{temp_input_path}" -ss 5 -t 30 "edited_{filename}"
+    """
+
+    # Get FFmpeg command from Gemini; the remote file stays registered for later prompts
     try:
-        # Upload to Gemini for analysis
-        video_file_obj = genai.upload_file(path=temp_input_path)
-        
-        # Wait for processing
-        while video_file_obj.state.name == "PROCESSING":
-            time.sleep(5)
-            video_file_obj = genai.get_file(video_file_obj.name)
-        
-        if video_file_obj.state.name == "FAILED":
-            raise HTTPException(status_code=500, detail="Failed to process video")
-        
-        # Create prompt for Gemini
-        prompt = f"""
-        Analyze this video and provide only an FFmpeg command to improve it by removing stutters, long pauses, and loading times.
-        
-        The input video file path is: {temp_input_path}
-        
-        Look for issues like:
-        - Stutters or repeated words
-        - Long waiting time for loading screens
-        - Long pauses or dead air
-        - Sections that should be cut out
-        
-        Return ONLY the FFmpeg command, nothing else. Use the exact input path provided.
-        Format the output path as: edited_{file.filename}
-        
-        Example format: ffmpeg -i "{temp_input_path}" -ss 5 -t 30 "edited_{file.filename}"
-        """
-        
-        # Get FFmpeg command from Gemini
-        response = gemini_model.generate_content([video_file_obj, prompt])
+        with gemini_file_registry.use(content_hash, temp_input_path, job) as video_file_obj:
+            with job.stage("generate_content"):
+                response = gemini_model.generate_content([video_file_obj, prompt])
+    except GeminiFileError:
+        raise HTTPException(status_code=500, detail="Failed to process video")
+
+    # Clean up command formatting
+    with job.stage("command_cleanup"):
         ffmpeg_command = response.text.strip()
-        
-        # Clean up command formatting
         if ffmpeg_command.startswith('```'):
             lines = ffmpeg_command.split('\n')
             ffmpeg_command = '\n'.join([line for line in lines if not line.startswith('```')])
             ffmpeg_command = ffmpeg_command.strip()
-        
-        # Prepare response data
-        output_filename = f"edited_{file.filename}"
-        
-        # Clean up Gemini file
-        genai.delete_file(video_file_obj.name)
-        
-        # Return the FFmpeg command and metadata
-        return JSONResponse({
-            "status": "success",
-            "original_filename": file.filename,
-            "suggested_output_filename": output_filename,
-            "ffmpeg_command": ffmpeg_command,
-            "instructions": [
-                "1. Save the above FFmpeg command to a file or copy it",
-                "2. Make sure FFmpeg is installed on your system",
-                "3. Run the command in your terminal/command prompt",
-                f"4. The edited video will be saved as '{output_filename}'"
-            ]
-        })
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        # Clean up temp input file
-        if os.path.exists(temp_input_path):
-            os.remove(temp_input_path)
+
+    return ffmpeg_command
+
+
+def analysis_response(filename, ffmpeg_command):
+    """Response body shared by /analyze-video/ and resumable uploads"""
+    output_filename = f"edited_{filename}"
+    return {
+        "status": "success",
+        "original_filename": filename,
+        "suggested_output_filename": output_filename,
+        "ffmpeg_command": ffmpeg_command,
+        "instructions": [
+            "1. Save the above FFmpeg command to a file or copy it",
+            "2. Make sure FFmpeg is installed on your system",
+            "3. Run the command in your terminal/command prompt",
+            f"4. The edited video will be saved as '{output_filename}'"
+        ]
+    }
+
+
+def analyze_upload(upload_id):
+    """
+    Run the Gemini analysis for a fully received resumable upload.
+    Only one caller (across workers) wins the claim; the result is stored with the upload.
+    """
+    if not upload_store.claim(upload_id, "received", "analyzing"):
+        return
+
+    meta = upload_store.status(upload_id)
+    job = JobRecord(METRICS_APP, meta["filename"])
+
+    with JOBS_IN_PROGRESS.track_inprogress(app=METRICS_APP):
+        try:
+            with job.stage("hash_input"):
+                job.set_input(upload_store.sha256(upload_id), meta["size"])
+            INPUT_SIZE.observe(meta["size"], app=METRICS_APP)
+            ffmpeg_command = generate_ffmpeg_command(upload_store.data_path(upload_id), meta["filename"], job)
+            job.set_result(ffmpeg_command)
+            upload_store.update(upload_id, status="done", ffmpeg_command=ffmpeg_command, job_id=job.job_id)
+            JOBS_TOTAL.inc(app=METRICS_APP, outcome="success")
+
+        except Exception as e:
+            JOBS_TOTAL.inc(app=METRICS_APP, outcome="error")
+            job.error = str(e)
+            upload_store.update(upload_id, status="failed", error=str(e), job_id=job.job_id)
+
+        finally:
+            get_ledger().append(job)
+            upload_store.discard_data(upload_id)
+
+
+def start_upload_analysis(upload_id):
+    threading.Thread(target=analyze_upload, args=(upload_id,), daemon=True).start()
+
+
+def upload_summary(status):
+    return {
+        "upload_id": status["upload_id"],
+        "filename": status["filename"],
+        "size": status["size"],
+        "status": status["status"],
+        "received": status["ranges"],
+        "missing": status["missing"],
+    }
+
+
+@app.post("/analyze-video/")
+def analyze_video(file: UploadFile = File(...), renditions: bool = False, hls: bool = False,
+                  profile: str = "auto", normalize_loudness: bool = False,
+                  target_realtime: float = TARGET_REALTIME, max_size_mb: Optional[float] = None,
+                  profile_job: bool = False):
+    """
+    Upload a video file and get an FFmpeg command to edit it with stutters and pauses removed.
+    With renditions=true, also get a single-pass command that writes the whole rendition ladder.
+    profile picks the encoding profile (auto, standard or screen); unless it resolves to standard,
+    a render_command re-encoding the edit with that profile is included.
+    normalize_loudness=true measures the loudness once (cached per content hash) and adds
+    EBU R128 normalization to render_command and rendition_command.
+    target_realtime/max_size_mb choose the encoder settings from the host's calibration (encoder_tuning.py).
+    profile_job=true records a profiling bundle (Python profile, FFmpeg benchmarks, per-filter timing,
+    stage timeline), downloadable from /jobs/{job_id}/profile
+    """
+    if not file.filename.endswith(VIDEO_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Only video files are supported")
+    if profile not in PROFILE_CHOICES:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {', '.join(PROFILE_CHOICES)}")
+
+    # Save uploaded file temporarily
+    temp_input_path = f"temp_videos/{file.filename}"
+    job = JobRecord(METRICS_APP, file.filename)
+    profiler = JobProfiler(job).start() if profile_job else None
+
+    with JOBS_IN_PROGRESS.track_inprogress(app=METRICS_APP):
+        try:
+            save_upload(file, temp_input_path, job)
+            ffmpeg_command = generate_ffmpeg_command(temp_input_path, file.filename, job)
+            job.set_result(ffmpeg_command)
+
+            response = analysis_response(file.filename, ffmpeg_command)
+            # Everything past the Gemini command needs ffmpeg/ffprobe on this host; if that fails,
+            # the analysis is still returned, with the reason the render commands are missing
+            try:
+                profile_name, encoding = resolve_profile(profile, temp_input_path, file.filename, METRICS_APP)
+                response["encoding_profile"] = profile_name
+                encoder = settings_for_job(temp_input_path, ffmpeg_command, target_realtime or None, max_size_mb)
+                if profile_name == "standard":
+                    encoding = apply_settings(encoding, encoder)
+                    response["encoder_settings"] = encoder
+                loudness = None
+                if normalize_loudness:
+                    try:
+                        with job.stage("loudness_measure"):
+                            loudness = measure_loudness(temp_input_path, METRICS_APP)
+                        response["loudness"] = loudness
+                    except LoudnessError as e:
+                        response["loudness_error"] = str(e)
+                if profile_name != "standard" or loudness or encoder["source"] == "calibrated":
+                    try:
+                        response["render_command"] = build_render_command(
+                            ffmpeg_command, temp_input_path, response["suggested_output_filename"], encoding,
+                            loudness=loudness
+                        )
+                    except LadderError as e:
+                        response["render_error"] = str(e)
+                if renditions:
+                    try:
+                        ladder = load_ladder()
+                        ladder_command, ladder_outputs = build_ladder_command(
+                            ffmpeg_command, temp_input_path, RENDITIONS_DIR, ladder=ladder, hls=hls, profile=encoding,
+                            loudness=loudness
+                        )
+                        # ffmpeg doesn't create the output directory for MP4 rungs
+                        response["rendition_command"] = f"mkdir -p {RENDITIONS_DIR} && {ladder_command}"
+                        response["rendition_outputs"] = ladder_outputs
+                        if hls:
+                            base_name = os.path.splitext(os.path.basename(temp_input_path))[0]
+                            response["master_playlist_path"] = master_playlist_path(RENDITIONS_DIR, base_name)
+                            response["master_playlist"] = master_playlist(ladder, ladder_outputs)
+                    except LadderError as e:
+                        response["rendition_error"] = str(e)
+            except (OSError, JoinError, subprocess.SubprocessError, ResourceLimitExceeded) as e:
+                response["render_error"] = f"Couldn't prepare the render commands: {e}"
+            if profiler:
+                # Time the filters of the command the client is going to run, while the input is still here
+                with job.stage("filter_timing"):
+                    profiler.time_filters(response.get("render_command") or ffmpeg_command)
+                response["job_id"] = job.job_id
+                response["profile_url"] = f"/jobs/{job.job_id}/profile"
+
+            JOBS_TOTAL.inc(app=METRICS_APP, outcome="success")
+
+            # Return the FFmpeg command and metadata
+            return JSONResponse(response)
+
+        except Exception as e:
+            JOBS_TOTAL.inc(app=METRICS_APP, outcome="error")
+            job.error = str(e)
+            # Failed jobs are the ones worth profiling: say where the bundle is
+            headers = {"X-Job-Id": job.job_id} if profiler else None
+            raise HTTPException(status_code=500, detail=str(e), headers=headers)
+
+        finally:
+            get_ledger().append(job)
+            if profiler:
+                profiler.finish()
+            # Clean up temp input file
+            if os.path.exists(temp_input_path):
+                os.remove(temp_input_path)
 
 @app.post("/get-command-only/")
-async def get_command_only(file: UploadFile = File(...)):
+def get_command_only(file: UploadFile = File(...)):
     """
     Alternative endpoint that returns just the FFmpeg command as plain text
     """
-    if not file.filename.endswith(('.mp4', '.mov', '.avi', '.mkv')):
+    if not file.filename.endswith(VIDEO_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Only video files are supported")
-    
+
     # Save uploaded file temporarily
     temp_input_path = f"temp_videos/{file.filename}"
-    with open(temp_input_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
+    job = JobRecord(METRICS_APP, file.filename)
+
+    with JOBS_IN_PROGRESS.track_inprogress(app=METRICS_APP):
+        try:
+            save_upload(file, temp_input_path, job)
+            ffmpeg_command = generate_ffmpeg_command(temp_input_path, file.filename, job)
+            job.set_result(ffmpeg_command)
+
+            JOBS_TOTAL.inc(app=METRICS_APP, outcome="success")
+
+            # Return just the command as plain text
+            return ffmpeg_command
+
+        except Exception as e:
+            JOBS_TOTAL.inc(app=METRICS_APP, outcome="error")
+            job.error = str(e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+        finally:
+            get_ledger().append(job)
+            # Clean up temp input file
+            if os.path.exists(temp_input_path):
+                os.remove(temp_input_path)
+
+@app.post("/uploads/")
+async def initiate_upload(upload: UploadInit):
+    """
+    Start a resumable upload; PUT chunks to /uploads/{upload_id}?offset=N afterwards
+    """
+    if not upload.filename.endswith(VIDEO_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Only video files are supported")
+
+    upload_store.purge_expired()
     try:
-        # Upload to Gemini for analysis
-        video_file_obj = genai.upload_file(path=temp_input_path)
-        
-        # Wait for processing
-        while video_file_obj.state.name == "PROCESSING":
-            time.sleep(5)
-            video_file_obj = genai.get_file(video_file_obj.name)
-        
-        if video_file_obj.state.name == "FAILED":
-            raise HTTPException(status_code=500, detail="Failed to process video")
-        
-        # Create prompt for Gemini
-        prompt = f"""
-        Analyze this video and provide only an FFmpeg command to improve it by removing stutters, long pauses, and loading times.
-        
-        The input video file path is: {temp_input_path}
-        
-        Look for issues like:
-        - Stutters or repeated words
-        - Long waiting time for loading screens
-        - Long pauses or dead air
-        - Sections that should be cut out
-        
-        Return ONLY the FFmpeg command, nothing else. Use the exact input path provided.
-        Format the output path as: edited_{file.filename}
-        
-        Example format: ffmpeg -i "{temp_input_path}" -ss 5 -t 30 "edited_{file.filename}"
-        """
-        
-        # Get FFmpeg command from Gemini
-        response = gemini_model.generate_content([video_file_obj, prompt])
-        ffmpeg_command = response.text.strip()
-        
-        # Clean up command formatting
-        if ffmpeg_command.startswith('```'):
-            lines = ffmpeg_command.split('\n')
-            ffmpeg_command = '\n'.join([line for line in lines if not line.startswith('```')])
-            ffmpeg_command = ffmpeg_command.strip()
-        
-        # Clean up Gemini file
-        genai.delete_file(video_file_obj.name)
-        
-        # Return just the command as plain text
-        return ffmpeg_command
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    
-    finally:
-        # Clean up temp input file
-        if os.path.exists(temp_input_path):
-            os.remove(temp_input_path)
+        meta = upload_store.create(upload.filename, upload.size)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    return {
+        "upload_id": meta["upload_id"],
+        "chunk_size": meta["chunk_size"],
+        "upload_url": f"/uploads/{meta['upload_id']}",
+    }
+
+@app.put("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, offset: int, request: Request):
+    """
+    Write one chunk at its byte offset. Chunks may arrive in any order and in parallel;
+    the analysis starts as soon as the last missing byte lands
+    """
+    content_length = request.headers.get("content-length")
+    try:
+        # Stream the raw body straight into place instead of spooling a multipart form
+        # Disk writes and bookkeeping run in the threadpool so parallel chunk PUTs keep streaming
+        with upload_store.open_chunk(upload_id, offset, int(content_length) if content_length else None) as writer:
+            async for data in request.stream():
+                await run_in_threadpool(writer.write, data)
+        status = await run_in_threadpool(upload_store.record_chunk, upload_id, offset, writer.written)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    BYTES_PROCESSED.inc(writer.written, app=METRICS_APP, stage="upload_chunk")
+    if status["status"] == "received":
+        start_upload_analysis(upload_id)
+
+    return upload_summary(status)
+
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    """
+    Byte ranges received so far and still missing, for resuming an interrupted upload
+    """
+    try:
+        return upload_summary(upload_store.status(upload_id))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, wait: bool = True):
+    """
+    Finalize an upload and return the FFmpeg command (or 202 while analysis runs if wait=false)
+    """
+    try:
+        status = upload_store.status(upload_id)
+        if status["status"] == "uploading":
+            return JSONResponse(upload_summary(status), status_code=409)
+        if status["status"] == "received":
+            start_upload_analysis(upload_id)
+
+        while wait and status["status"] in ("received", "analyzing"):
+            await asyncio.sleep(1)
+            status = upload_store.status(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    if status["status"] == "done":
+        return JSONResponse(dict(analysis_response(status["filename"], status["ffmpeg_command"]), job_id=status["job_id"]))
+    if status["status"] == "failed":
+        raise HTTPException(status_code=500, detail=status["error"])
+    return JSONResponse(upload_summary(status), status_code=202)
+
+@app.post("/join-videos/")
+def join_videos(files: List[UploadFile] = File(...), analyze: bool = Form(False)):
+    """
+    Join several clips into one video (stream copy when codecs match) and optionally
+    get an FFmpeg command for the joined timeline
+    """
+    if len(files) < 2:
+        raise HTTPException(status_code=400, detail="Upload at least two clips to join")
+    if not all(f.filename.endswith(VIDEO_EXTENSIONS) for f in files):
+        raise HTTPException(status_code=400, detail="Only video files are supported")
+
+    purge_joined_videos()
+    batch_id = uuid.uuid4().hex
+    extension = Path(files[0].filename).suffix
+    joined_filename = f"joined_{batch_id}{extension}"
+    joined_path = os.path.join("joined_videos", joined_filename)
+    clip_paths = [f"temp_videos/{batch_id}_{i}_{f.filename}" for i, f in enumerate(files)]
+    job = JobRecord(METRICS_APP, joined_filename)
+
+    with JOBS_IN_PROGRESS.track_inprogress(app=METRICS_APP):
+        try:
+            for upload, clip_path in zip(files, clip_paths):
+                save_upload(upload, clip_path, job)
+
+            with job.stage("join"):
+                summary = join_clips(clip_paths, joined_path, METRICS_APP, job=job)
+
+            response = {
+                "status": "success",
+                "joined_filename": joined_filename,
+                "download_url": f"/joined-videos/{joined_filename}",
+                "stream_copy": summary["fast_path"],
+                "normalized_clips": [files[clip_paths.index(p)].filename for p in summary["normalized"]],
+                "duration": summary["duration"],
+            }
+
+            if analyze:
+                ffmpeg_command = generate_ffmpeg_command(joined_path, joined_filename, job)
+                job.set_result(ffmpeg_command)
+                response["suggested_output_filename"] = f"edited_{joined_filename}"
+                response["ffmpeg_command"] = ffmpeg_command
+
+            JOBS_TOTAL.inc(app=METRICS_APP, outcome="success")
+            return JSONResponse(response)
+
+        except JoinError as e:
+            JOBS_TOTAL.inc(app=METRICS_APP, outcome="error")
+            job.error = str(e)
+            raise HTTPException(status_code=422, detail=str(e))
+
+        except Exception as e:
+            JOBS_TOTAL.inc(app=METRICS_APP, outcome="error")
+            job.error = str(e)
+            raise HTTPException(status_code=500, detail=str(e))
+
+        finally:
+            get_ledger().append(job)
+            # Clean up uploaded clips; the joined video is kept for download until JOINED_VIDEO_TTL_SECONDS
+            for clip_path in clip_paths:
+                if os.path.exists(clip_path):
+                    os.remove(clip_path)
+
+@app.get("/joined-videos/{filename}")
+async def download_joined_video(filename: str):
+    """
+    Download a video produced by /join-videos/
+    """
+    joined_path = os.path.join("joined_videos", os.path.basename(filename))
+    if not os.path.exists(joined_path):
+        raise HTTPException(status_code=404, detail="Joined video not found")
+    return FileResponse(joined_path, filename=os.path.basename(filename))
+
+@app.get("/jobs/{job_id}/profile")
+async def download_job_profile(job_id: str):
+    """
+    Download the profiling bundle (zip) of a job run with profile_job=true
+    """
+    path = profile_path(job_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No profile for this job")
+    return FileResponse(path, filename=f"profile_{job_id}.zip", media_type="application/zip")
+
+@app.get("/ffmpeg-jobs")
+async def list_ffmpeg_jobs():
+    """
+    FFmpeg jobs queued or running on the scheduler, with their threads, cores and memory
+    """
+    return {"jobs": get_scheduler().jobs()}
+
+@app.post("/ffmpeg-jobs/{job_id}/cancel")
+async def cancel_ffmpeg_job(job_id: int):
+    """
+    Cancel a queued FFmpeg job or kill a running one
+    """
+    if not get_scheduler().cancel(job_id):
+        raise HTTPException(status_code=404, detail="FFmpeg job not found")
+    return {"job_id": job_id, "status": "cancelling"}
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness probe: the worker is up and serving requests
+    """
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness probe: 200 once the Gemini client has been warmed up
+    """
+    state = gemini_client.state()
+    body = {"status": state}
+    if state == "failed":
+        body["error"] = gemini_client.last_error()
+    return JSONResponse(body, status_code=200 if state == "ready" else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint with per-stage latency, bytes and queue depth
+    """
+    return Response(content=render_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/")
 async def root():
@@ -173,6 +551,13 @@ async def root():
         "message": "Video Editor API - Get FFmpeg commands for video editing",
         "endpoints": {
             "/analyze-video/": "Upload video and get detailed response with FFmpeg command",
-            "/get-command-only/": "Upload video and get just the FFmpeg command as plain text"
+            "/get-command-only/": "Upload video and get just the FFmpeg command as plain text",
+            "/uploads/": "Start a resumable chunked upload (PUT chunks by offset, GET status, POST .../complete)",
+            "/join-videos/": "Upload several clips, join them (stream copy when possible) and optionally analyze the result",
+            "/jobs/{job_id}/profile": "Profiling bundle of a job analyzed with profile_job=true",
+            "/ffmpeg-jobs": "Queued and running FFmpeg jobs (POST /ffmpeg-jobs/{id}/cancel to stop one)",
+            "/healthz": "Liveness probe",
+            "/readyz": "Readiness probe (ready once the Gemini client is warmed up)",
+            "/metrics": "Prometheus metrics for pipeline stages"
         }
     }
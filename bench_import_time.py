@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for worker/container cold starts.
+
+Imports each entry-point module in a fresh interpreter several times and
+fails (exit code 1) if the median import time goes over budget or if a heavy
+dependency is imported eagerly.
+
+Usage:
+    python bench_import_time.py [--runs 5] [--max-seconds 1.5] [module ...]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["api", "ai_video_editor_simple"]
+
+# Modules that must only be loaded on first use
+LAZY_MODULES = ["google.generativeai", "grpc", "ffmpeg", "numpy"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module, runs):
+    """Return (import times, eagerly loaded heavy modules) for a module"""
+    times = []
+    loaded = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, lazy=LAZY_MODULES)],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=dict(os.environ, WARMUP_ON_STARTUP="0")
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        times.append(data["seconds"])
+        loaded.update(data["loaded"])
+    return times, sorted(loaded)
+
+
+def slowest_imports(module, limit=10):
+    """Top cumulative entries from `python -X importtime`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].strip()))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Guard against import-time regressions")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--max-seconds", type=float, default=float(os.getenv("IMPORT_BUDGET_SECONDS", "1.5")),
+                        help="Budget for the median import time")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    failed = False
+    for module in args.modules:
+        times, loaded = measure(module, args.runs)
+        median = statistics.median(times)
+        ok = median <= args.max_seconds and not loaded
+        failed = failed or not ok
+        results[module] = {"median_s": median, "min_s": min(times), "eager_heavy_imports": loaded, "ok": ok}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for module, row in results.items():
+            status = "OK" if row["ok"] else "FAIL"
+            print(f"{status:<5}{module:<28}median {row['median_s']:.3f}s  min {row['min_s']:.3f}s"
+                  f"  (budget {args.max_seconds:.2f}s)")
+            if row["eager_heavy_imports"]:
+                print(f"     eagerly imported: {', '.join(row['eager_heavy_imports'])}")
+            if not row["ok"]:
+                for microseconds, name in slowest_imports(module):
+                    print(f"     {microseconds / 1e6:8.3f}s  {name}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""
+Resumable chunked uploads.
+
+Protocol (see api.py):
+    POST /uploads/                      initiate, returns upload_id and chunk size
+    PUT  /uploads/{id}?offset=N         raw chunk bytes, any order, in parallel
+    GET  /uploads/{id}                  received and missing byte ranges
+    POST /uploads/{id}/complete         wait for (or start) the analysis
+
+Chunks are written straight to their offset in a preallocated target file.
+Upload state lives in a JSON sidecar guarded by a file lock, so any worker
+process can accept any chunk. Each process keeps a running SHA-256 over the
+contiguous prefix it has seen, so the hash is ready as soon as the last
+chunk lands instead of needing another full read.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from content_hash import CHUNK_SIZE, remember
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+UPLOAD_DIR = os.path.join("temp_videos", "uploads")
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024 * 1024)))
+UPLOAD_TTL_SECONDS = int(os.getenv("UPLOAD_TTL_SECONDS", str(24 * 3600)))
+
+
+class UploadError(Exception):
+    """Invalid upload request; status_code is the HTTP status to report"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def merge_range(ranges, start, end):
+    """Add [start, end) to a sorted list of disjoint [start, end) ranges"""
+    merged = []
+    for r_start, r_end in sorted(ranges + [[start, end]]):
+        if merged and r_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], r_end)
+        else:
+            merged.append([r_start, r_end])
+    return merged
+
+
+def missing_ranges(ranges, size):
+    """Gaps in the received ranges"""
+    missing = []
+    cursor = 0
+    for start, end in ranges:
+        if start > cursor:
+            missing.append([cursor, start])
+        cursor = max(cursor, end)
+    if cursor < size:
+        missing.append([cursor, size])
+    return missing
+
+
+class _RunningHash:
+    """SHA-256 over the contiguous prefix of the target file seen by this process"""
+
+    def __init__(self):
+        self.hasher = hashlib.sha256()
+        self.offset = 0
+        self.lock = threading.Lock()
+        self.target = 0
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def advance(self, data_path, contiguous_end):
+        with self.lock:
+            if self.offset >= contiguous_end:
+                return
+            with open(data_path, "rb") as f:
+                f.seek(self.offset)
+                remaining = contiguous_end - self.offset
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.hasher.update(chunk)
+                    remaining -= len(chunk)
+                    self.offset += len(chunk)
+
+    def advance_in_background(self, data_path, contiguous_end):
+        """advance() on a worker thread; one worker per upload keeps catching up to the latest end"""
+        with self._worker_lock:
+            self.target = max(self.target, contiguous_end)
+            if self._worker is not None or self.offset >= self.target:
+                return
+            self._worker = threading.Thread(target=self._catch_up, args=(data_path,), daemon=True)
+            self._worker.start()
+
+    def _catch_up(self, data_path):
+        try:
+            while True:
+                with self._worker_lock:
+                    target = self.target
+                    if self.offset >= target:
+                        return
+                self.advance(data_path, target)
+        except OSError:
+            # Data discarded mid-upload; sha256() re-reads whatever it still needs
+            return
+        finally:
+            with self._worker_lock:
+                self._worker = None
+
+
+class ChunkWriter:
+    """Writes one chunk in place, refusing to run past the declared file size"""
+
+    def __init__(self, path, offset, limit):
+        self.offset = offset
+        self.limit = limit
+        self.written = 0
+        self._fd = os.open(path, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+        os.lseek(self._fd, offset, os.SEEK_SET)
+
+    def write(self, data):
+        if self.offset + self.written + len(data) > self.limit:
+            raise UploadError("Chunk extends past the declared size")
+        view = memoryview(data)
+        while view:
+            count = os.write(self._fd, view)
+            view = view[count:]
+        self.written += len(data)
+
+    def close(self):
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class UploadStore:
+    """Upload sessions stored as <id><ext> (data, e.g. <id>.mp4) and <id>.json (state)"""
+
+    def __init__(self, directory=UPLOAD_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._hashes = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _data_path(self, meta):
+        # Keep the video extension: the Gemini SDK infers the MIME type from it
+        return os.path.join(self.directory, f"{meta['upload_id']}{meta['extension']}")
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.json")
+
+    @contextmanager
+    def _locked(self, upload_id):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, f"{upload_id}.lock"), "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, upload_id):
+        # upload ids are hex uuids; reject anything else before touching the filesystem
+        if not upload_id.isalnum():
+            raise UploadError("Unknown upload", 404)
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise UploadError("Unknown upload", 404)
+
+    def _save(self, meta):
+        tmp_path = f"{self._meta_path(meta['upload_id'])}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(meta["upload_id"]))
+
+    def create(self, filename, size, chunk_size=DEFAULT_CHUNK_SIZE):
+        if size <= 0:
+            raise UploadError("size must be positive")
+        if size > MAX_UPLOAD_BYTES:
+            raise UploadError(f"Upload exceeds {MAX_UPLOAD_BYTES} bytes", 413)
+
+        meta = {
+            "upload_id": uuid.uuid4().hex,
+            "filename": os.path.basename(filename),
+            "extension": os.path.splitext(filename)[1].lower(),
+            "size": size,
+            "chunk_size": chunk_size,
+            "created": time.time(),
+            "ranges": [],
+            "status": "uploading",
+        }
+        # Preallocate so chunks can be written at any offset
+        with open(self._data_path(meta), "wb") as f:
+            f.truncate(size)
+        self._save(meta)
+        return meta
+
+    def status(self, upload_id):
+        meta = self._load(upload_id)
+        return dict(meta, missing=missing_ranges(meta["ranges"], meta["size"]))
+
+    def data_path(self, upload_id):
+        return self._data_path(self._load(upload_id))
+
+    def open_chunk(self, upload_id, offset, length=None):
+        """Validate a chunk and return a ChunkWriter positioned at its offset"""
+        meta = self._load(upload_id)
+        if meta["status"] != "uploading":
+            raise UploadError("Upload already complete", 409)
+        if offset < 0 or offset >= meta["size"]:
+            raise UploadError("offset outside the file")
+        if length is not None and offset + length > meta["size"]:
+            raise UploadError("Chunk extends past the declared size")
+        return ChunkWriter(self._data_path(meta), offset, meta["size"])
+
+    def record_chunk(self, upload_id, offset, length):
+        """Mark [offset, offset + length) as received; returns the updated status"""
+        with self._locked(upload_id):
+            meta = self._load(upload_id)
+            if offset + length > meta["size"]:
+                raise UploadError("Chunk extends past the declared size")
+            meta["ranges"] = merge_range(meta["ranges"], offset, offset + length)
+            if meta["ranges"] == [[0, meta["size"]]] and meta["status"] == "uploading":
+                meta["status"] = "received"
+            self._save(meta)
+
+        # Hash whatever is now contiguous from the start of the file, off the request path
+        contiguous_end = meta["ranges"][0][1] if meta["ranges"] and meta["ranges"][0][0] == 0 else 0
+        self._running_hash(upload_id).advance_in_background(self._data_path(meta), contiguous_end)
+        return dict(meta, missing=missing_ranges(meta["ranges"], meta["size"]))
+
+    def _running_hash(self, upload_id):
+        with self._lock:
+            running = self._hashes.get(upload_id)
+            if running is None:
+                running = self._hashes[upload_id] = _RunningHash()
+            return running
+
+    def sha256(self, upload_id):
+        """Hash of the complete file, finishing the running hash if needed"""
+        meta = self._load(upload_id)
+        if meta.get("sha256"):
+            return meta["sha256"]
+        if meta["ranges"] != [[0, meta["size"]]]:
+            raise UploadError("Upload is not complete", 409)
+
+        data_path = self._data_path(meta)
+        running = self._running_hash(upload_id)
+        running.advance(data_path, meta["size"])
+        value = running.hasher.hexdigest()
+        remember(data_path, value)
+
+        with self._locked(upload_id):
+            meta = self._load(upload_id)
+            meta["sha256"] = value
+            self._save(meta)
+        with self._lock:
+            self._hashes.pop(upload_id, None)
+        return value
+
+    def claim(self, upload_id, from_status, to_status):
+        """Atomically move an upload between states; returns True if this caller won"""
+        with self._locked(upload_id):
+            meta = self._load(upload_id)
+            if meta["status"] != from_status:
+                return False
+            meta["status"] = to_status
+            self._save(meta)
+            return True
+
+    def update(self, upload_id, **fields):
+        with self._locked(upload_id):
+            meta = self._load(upload_id)
+            meta.update(fields)
+            self._save(meta)
+            return meta
+
+    def discard_data(self, upload_id):
+        """Remove the uploaded video but keep the state (and any results) until it expires"""
+        data_path = self.data_path(upload_id)
+        if os.path.exists(data_path):
+            os.remove(data_path)
+
+    def delete(self, upload_id):
+        try:
+            data_path = self.data_path(upload_id)
+        except (UploadError, json.JSONDecodeError):
+            data_path = None
+        with self._lock:
+            self._hashes.pop(upload_id, None)
+        paths = [data_path] + [os.path.join(self.directory, f"{upload_id}{suffix}") for suffix in (".json", ".lock")]
+        for path in paths:
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def purge_expired(self, ttl=UPLOAD_TTL_SECONDS):
+        """Remove uploads older than ttl seconds"""
+        removed = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            try:
+                meta = self._load(upload_id)
+            except (UploadError, json.JSONDecodeError):
+                continue
+            if now - meta["created"] > ttl:
+                self.delete(upload_id)
+                removed += 1
+        return removed
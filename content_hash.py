@@ -0,0 +1,64 @@
+"""
+Content hashing for uploaded videos.
+
+Hashes are used to key the job ledger and any per-video caches, so the same
+recording is recognised regardless of its file name.
+"""
+
+import hashlib
+import os
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def file_sha256(path):
+    """
+    Return the hex SHA-256 of a file, memoised on (path, size, mtime) so repeated
+    lookups for the same upload don't re-read it.
+    """
+    key = _stat_key(path)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+
+    remember(path, value)
+    return value
+
+
+def remember(path, value):
+    """Record a hash computed elsewhere (e.g. while the file was being written)"""
+    key = _stat_key(path)
+    with _cache_lock:
+        _cache[key] = value
+
+
+def hashing_copy(src, dst_path):
+    """
+    Copy a file-like object to dst_path, hashing it on the way.
+    Returns (bytes_written, hex_sha256).
+    """
+    digest = hashlib.sha256()
+    written = 0
+    with open(dst_path, "wb") as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            dst.write(chunk)
+            written += len(chunk)
+    value = digest.hexdigest()
+    remember(dst_path, value)
+    return written, value
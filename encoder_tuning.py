@@ -0,0 +1,248 @@
+"""
+Encoder settings autotuner.
+
+`python encoder_tuning.py calibrate` encodes short samples on this machine
+across x264 presets, CRFs and thread counts, recording fps, realtime factor,
+CPU-seconds and bitrate, and saves the results as the host's encoder profile.
+The renderers then pick, per job, the best-quality settings that still meet
+the speed target (minimum realtime factor) and, if given, the output size
+limit. Without a profile the old defaults (medium, CRF 23) are used.
+
+Usage:
+    python encoder_tuning.py calibrate [--sample video.mp4 ...] [--seconds 10]
+    python encoder_tuning.py show [--target-realtime 2] [--max-kbps 3000]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import shlex
+import subprocess
+import tempfile
+import time
+
+from ffmpeg_runner import parse_media_seconds, run_ffmpeg
+from ffmpeg_scheduler import CPU_BUDGET, DEFAULT_JOB_THREADS
+from review_timeline import kept_segments
+from video_join import JoinError, probe_clip
+
+PROFILE_PATH = os.getenv("ENCODER_PROFILE_PATH", os.path.join("cache", "encoder_profile.json"))
+TARGET_REALTIME = float(os.getenv("ENCODER_TARGET_REALTIME", "1.0"))
+MAX_KBPS = float(os.getenv("ENCODER_MAX_KBPS", "0")) or None
+
+DEFAULT_SETTINGS = {"preset": "medium", "crf": 23, "threads": None, "source": "default"}
+DEFAULT_SAMPLES = ["lavfi:testsrc2=size=1280x720:rate=30"]
+DEFAULT_PRESETS = ["ultrafast", "veryfast", "faster", "medium", "slow"]
+DEFAULT_CRFS = [20, 23, 26, 28]
+# Audio is encoded at this rate by the renderers; it counts against a size limit
+AUDIO_KBPS = 192
+
+_BENCH_PATTERN = re.compile(r"bench: utime=([\d.]+)s stime=([\d.]+)s rtime=([\d.]+)s")
+_FRAME_PATTERN = re.compile(r"frame=\s*(\d+)")
+_LAVFI_SIZE = re.compile(r"size=(\d+)x(\d+)")
+
+
+def _sample_input(sample):
+    """ffmpeg input args and pixel count for a sample file or a `lavfi:<graph>` source"""
+    if sample.startswith("lavfi:"):
+        graph = sample[len("lavfi:"):]
+        size = _LAVFI_SIZE.search(graph)
+        pixels = int(size.group(1)) * int(size.group(2)) if size else 320 * 240
+        return ["-f", "lavfi", "-i", graph], pixels
+    signature = probe_clip(sample)["signature"]
+    return ["-i", sample], (signature["width"] or 0) * (signature["height"] or 0)
+
+
+def benchmark(sample, preset, crf, threads, seconds, output_dir, app="calibration"):
+    """Encode `seconds` of a sample once; returns one result row"""
+    input_args, pixels = _sample_input(sample)
+    output_path = os.path.join(output_dir, f"{preset}_{crf}_{threads}.mp4")
+    args = (["ffmpeg", "-y", "-benchmark", "-t", str(seconds)] + input_args +
+            ["-an", "-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-threads", str(threads),
+             "-pix_fmt", "yuv420p", output_path])
+    result = run_ffmpeg(shlex.join(args), app, output_path=output_path, threads=threads)
+    bench = _BENCH_PATTERN.search(result.stderr or "")
+    media_seconds = parse_media_seconds(result.stderr)
+    if result.returncode != 0 or not bench or not media_seconds:
+        raise RuntimeError(f"Benchmark failed for {preset}/crf {crf}/{threads} threads: {result.stderr[-300:]}")
+
+    user, system, real = (float(value) for value in bench.groups())
+    frames = _FRAME_PATTERN.findall(result.stderr)
+    size = os.path.getsize(output_path)
+    os.remove(output_path)
+    return {
+        "sample": sample,
+        "pixels": pixels,
+        "preset": preset,
+        "crf": crf,
+        "threads": threads,
+        "media_seconds": round(media_seconds, 3),
+        "fps": round(int(frames[-1]) / real, 2) if frames and real else None,
+        "realtime_factor": round(media_seconds / real, 3) if real else None,
+        "cpu_seconds": round(user + system, 3),
+        "bytes": size,
+        "kbps": round(size * 8 / 1000 / media_seconds, 1),
+    }
+
+
+def _ffmpeg_version():
+    try:
+        result = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True)
+        return result.stdout.splitlines()[0] if result.stdout else None
+    except OSError:
+        return None
+
+
+def calibrate(samples=None, presets=None, crfs=None, threads=None, seconds=10, path=PROFILE_PATH,
+              progress=print):
+    """Run the benchmark grid and save the encoder profile; returns it"""
+    samples = samples or DEFAULT_SAMPLES
+    presets = presets or DEFAULT_PRESETS
+    crfs = crfs or DEFAULT_CRFS
+    threads = threads or sorted({DEFAULT_JOB_THREADS, CPU_BUDGET})
+
+    results = []
+    grid = list(itertools.product(samples, presets, crfs, threads))
+    with tempfile.TemporaryDirectory() as output_dir:
+        for index, (sample, preset, crf, thread_count) in enumerate(grid, 1):
+            row = benchmark(sample, preset, crf, thread_count, seconds, output_dir)
+            results.append(row)
+            if progress:
+                progress(f"[{index}/{len(grid)}] {preset:>9} crf {crf:<2} {thread_count:>2} threads: "
+                         f"{row['fps']} fps, {row['realtime_factor']}x realtime, {row['kbps']} kbps")
+
+    profile = {
+        "created": time.time(),
+        "host": {
+            "node": platform.node(),
+            "cpu_count": os.cpu_count(),
+            "cpu_budget": CPU_BUDGET,
+            "ffmpeg": _ffmpeg_version(),
+        },
+        "sample_seconds": seconds,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, path)
+    return profile
+
+
+def load_profile(path=PROFILE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _candidates(profile, pixels):
+    """Results averaged over samples per (preset, crf, threads), scaled to the job's frame size"""
+    grouped = {}
+    for row in profile["results"]:
+        # Encode time and bitrate grow roughly with the pixel count
+        scale = row["pixels"] / pixels if pixels and row.get("pixels") else 1
+        key = (row["preset"], row["crf"], row["threads"])
+        grouped.setdefault(key, []).append((row["realtime_factor"] * scale, row["kbps"] / scale))
+    for (preset, crf, threads), values in grouped.items():
+        yield {
+            "preset": preset,
+            "crf": crf,
+            "threads": threads,
+            "expected_realtime": round(sum(v[0] for v in values) / len(values), 2),
+            "expected_kbps": round(sum(v[1] for v in values) / len(values), 1),
+        }
+
+
+def choose_settings(target_realtime=TARGET_REALTIME, max_kbps=MAX_KBPS, pixels=None, profile=None):
+    """
+    Best-quality calibrated settings meeting the targets: lowest CRF, then smallest output,
+    then fastest. If nothing meets them, the settings that miss them by the least win.
+    """
+    profile = profile or load_profile()
+    if not profile or not profile.get("results"):
+        return dict(DEFAULT_SETTINGS)
+
+    def shortfall(candidate):
+        """Relative amount by which a candidate misses the targets (0 when it meets them)"""
+        missed = 0
+        if target_realtime:
+            missed += max(0, target_realtime / max(candidate["expected_realtime"], 1e-6) - 1)
+        if max_kbps:
+            missed += max(0, candidate["expected_kbps"] / max_kbps - 1)
+        return missed
+
+    candidates = list(_candidates(profile, pixels))
+    chosen = min(candidates, key=lambda c: (shortfall(c), c["crf"], c["expected_kbps"], -c["expected_realtime"]))
+    return dict(chosen, met_targets=shortfall(chosen) == 0, source="calibrated")
+
+
+def settings_for_job(input_path, command=None, target_realtime=TARGET_REALTIME, max_size_mb=None,
+                     max_kbps=MAX_KBPS):
+    """
+    choose_settings for one input: scaled to its frame size, with a size limit turned into
+    a video bitrate over the duration the edit command keeps
+    """
+    try:
+        probe = probe_clip(input_path)
+    except JoinError:
+        return choose_settings(target_realtime, max_kbps)
+    signature = probe["signature"]
+    pixels = (signature["width"] or 0) * (signature["height"] or 0) or None
+    if max_size_mb and probe["duration"]:
+        kept = sum(end - start for start, end in kept_segments(command, probe["duration"])) or probe["duration"]
+        size_kbps = max_size_mb * 8000 / kept - AUDIO_KBPS
+        max_kbps = min(max_kbps, size_kbps) if max_kbps else size_kbps
+    return choose_settings(target_realtime, max_kbps, pixels)
+
+
+def apply_settings(encoding_profile, settings):
+    """Encoding profile with the chosen preset and CRF"""
+    return dict(encoding_profile, preset=settings["preset"], crf=settings["crf"])
+
+
+def describe(settings):
+    text = f"preset {settings['preset']}, CRF {settings['crf']}"
+    if settings.get("threads"):
+        text += f", {settings['threads']} threads"
+    if settings["source"] == "calibrated":
+        text += f" (~{settings['expected_realtime']}x realtime, ~{settings['expected_kbps']:.0f} kbps"
+        text += ")" if settings["met_targets"] else ", targets not reachable)"
+    else:
+        text += " (defaults, run `python encoder_tuning.py calibrate`)"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark x264 settings on this host and pick encoder settings")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = subparsers.add_parser("calibrate", help="Benchmark presets/CRFs/threads and save the profile")
+    calibrate_parser.add_argument("--sample", action="append",
+                                  help="Representative video (repeatable); default is a synthetic 720p source")
+    calibrate_parser.add_argument("--seconds", type=float, default=10, help="Seconds of each sample to encode")
+    calibrate_parser.add_argument("--presets", nargs="+", default=DEFAULT_PRESETS)
+    calibrate_parser.add_argument("--crfs", nargs="+", type=int, default=DEFAULT_CRFS)
+    calibrate_parser.add_argument("--threads", nargs="+", type=int, help="Thread counts to try")
+    calibrate_parser.add_argument("--profile", default=PROFILE_PATH, help="Where to save the profile")
+    show_parser = subparsers.add_parser("show", help="Print the settings that would be chosen")
+    show_parser.add_argument("--target-realtime", type=float, default=TARGET_REALTIME)
+    show_parser.add_argument("--max-kbps", type=float, default=MAX_KBPS)
+    show_parser.add_argument("--profile", default=PROFILE_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "calibrate":
+        calibrate(args.sample, args.presets, args.crfs, args.threads, args.seconds, args.profile)
+        print(f"Saved encoder profile to {args.profile}")
+        print(f"Default choice: {describe(choose_settings(profile=load_profile(args.profile)))}")
+    else:
+        settings = choose_settings(args.target_realtime, args.max_kbps, profile=load_profile(args.profile))
+        print(describe(settings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Encoding profiles, picked per input.
+
+Browser screen captures are mostly identical frames of static text. The
+"screen" profile drops near-duplicate frames with mpdecimate, writes
+variable-frame-rate output so the kept frames keep their timestamps, and
+tunes x264 for sharp static detail. Camera-oriented filters the AI likes to
+add (deshake, unsharp, denoisers) are stripped because they only blur text
+and cost time.
+"""
+
+import re
+import shlex
+
+from content_hash import file_sha256
+from ffmpeg_runner import run_ffmpeg
+
+PROFILES = {
+    "standard": {
+        "description": "Camera footage",
+        "preset": "medium",
+        "crf": 23,
+    },
+    "screen": {
+        "description": "Screen recordings: duplicate frames dropped, VFR output, tuned for text",
+        "preset": "faster",
+        "crf": 24,
+        "tune": "stillimage",
+        "video_filters": ["mpdecimate"],
+        "vfr": True,
+        "strip_filters": ["deshake", "vidstabdetect", "vidstabtransform", "unsharp", "hqdn3d", "nlmeans"],
+    },
+}
+PROFILE_CHOICES = ("auto",) + tuple(PROFILES)
+
+# Window titles / tool names that end up in screen-capture file names
+SCREEN_CAPTURE_NAME = re.compile(
+    r"google chrome|microsoft edge|mozilla firefox|screen[ _-]?(recording|capture|cast)|screencast|\bloom\b|\bobs\b",
+    re.IGNORECASE,
+)
+SAMPLE_SECONDS = 30
+SCREEN_DUPLICATE_RATIO = 0.5
+
+# Final stats printed at -v verbose
+_DECODED_PATTERN = re.compile(r"Input stream #\d+:\d+ \(video\):.*?(\d+) frames decoded")
+_ENCODED_PATTERN = re.compile(r"Output stream #\d+:\d+ \(video\): (\d+) frames encoded")
+_detected = {}
+
+
+def get_profile(name):
+    if name not in PROFILES:
+        raise ValueError(f"Unknown encoding profile '{name}' (choose from {', '.join(PROFILE_CHOICES)})")
+    return PROFILES[name]
+
+
+def strip_filters(graph, names, replacement="null"):
+    """Replace the named filters (with their options) by `null` (or `anull`) so the chain stays valid"""
+    if not graph or not names:
+        return graph
+    pattern = r"(?<![\w-])(?:%s)(?:=[^,;\[\]'\"]*)?(?=$|[,;\[\]'\"])" % "|".join(map(re.escape, names))
+    return re.sub(pattern, replacement, graph)
+
+
+def duplicate_frame_ratio(path, app="profiles", seconds=SAMPLE_SECONDS, cancel_event=None):
+    """
+    Share of frames mpdecimate drops in the first `seconds` of the video (None if unknown).
+    Both counts come from the same pass (ffmpeg's final stats), so variable frame rate
+    captures aren't measured against a nominal rate.
+    """
+    command = shlex.join(["ffmpeg", "-v", "verbose", "-t", str(seconds), "-i", path, "-map", "0:v:0", "-an",
+                          "-vf", "mpdecimate", "-f", "null", "-"])
+    result = run_ffmpeg(command, app, priority="preview", cancel_event=cancel_event)
+    decoded = _DECODED_PATTERN.findall(result.stderr or "")
+    kept = _ENCODED_PATTERN.findall(result.stderr or "")
+    if result.returncode != 0 or not decoded or not kept:
+        return None
+    total = max(int(count) for count in decoded)
+    if total < 1:
+        return None
+    return max(0.0, 1 - int(kept[-1]) / total)
+
+
+def detect_profile(path, filename=None, app="profiles", cancel_event=None):
+    """'screen' for screen captures (by file name, else by sampled duplicate frames), otherwise 'standard'"""
+    if SCREEN_CAPTURE_NAME.search(filename or path):
+        return "screen"
+    content_hash = file_sha256(path)
+    if content_hash not in _detected:
+        ratio = duplicate_frame_ratio(path, app, cancel_event=cancel_event)
+        _detected[content_hash] = "screen" if ratio is not None and ratio >= SCREEN_DUPLICATE_RATIO else "standard"
+    return _detected[content_hash]
+
+
+def resolve_profile(choice, path, filename=None, app="profiles"):
+    """Turn a user choice ('auto' or a profile name) into (name, profile)"""
+    name = detect_profile(path, filename, app) if choice == "auto" else choice
+    return name, get_profile(name)
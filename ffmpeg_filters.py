@@ -0,0 +1,33 @@
+"""
+Splitting FFmpeg filter graphs into filters.
+
+Filter arguments can contain commas and semicolons of their own
+(select='between(t,5,10)+between(t,20,30)', escaped \, in expressions), so
+graphs are split only on separators outside quotes and escapes.
+"""
+
+
+def split_graph(graph, separators=",;"):
+    """Split a filter graph on top-level separators, keeping quoted and escaped ones"""
+    parts, current, quoted, escaped = [], "", False, False
+    for char in graph:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "'":
+            quoted = not quoted
+        elif char in separators and not quoted:
+            if current.strip():
+                parts.append(current.strip())
+            current = ""
+            continue
+        current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def split_filters(chain):
+    """Split one filter chain (-vf/-af value) into its filters"""
+    return split_graph(chain, ",")
@@ -0,0 +1,67 @@
+"""
+Run FFmpeg commands through the scheduler and record how long they take.
+"""
+
+import os
+import re
+import threading
+import time
+
+from ffmpeg_scheduler import apply_benchmark, get_scheduler
+from metrics import BYTES_PROCESSED, FFMPEG_REALTIME_FACTOR, stage_timer
+
+_TIME_PATTERN = re.compile(r"time=\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_recorders = threading.local()
+
+
+def set_run_recorder(recorder):
+    """
+    While a recorder is set (per thread), commands run with -benchmark and
+    recorder(command, result, scheduled_job) is called after each one; None clears it
+    """
+    _recorders.current = recorder
+
+
+def parse_media_seconds(stderr):
+    """Return the last `time=` progress value ffmpeg printed, in seconds"""
+    matches = _TIME_PATTERN.findall(stderr or "")
+    if not matches:
+        return None
+    hours, minutes, seconds = matches[-1]
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def run_ffmpeg(command, app, output_path=None, cwd=None, timeout=None, job=None, priority="final",
+               threads=None, memory_mb=None, cancel_event=None):
+    """
+    Run an FFmpeg shell command on the scheduler and record duration, output bytes and realtime factor.
+    priority is "final" or "preview" (niced, fewer threads, admitted after queued finals).
+    When a job_ledger.JobRecord is given, the stage timing and outcome are stored on it.
+    Returns the subprocess.CompletedProcess; raises subprocess.TimeoutExpired past `timeout`
+    and ffmpeg_scheduler.JobCancelled once cancel_event is set.
+    """
+    scheduler = get_scheduler()
+    recorder = getattr(_recorders, "current", None)
+    if recorder is not None:
+        command = apply_benchmark(command)
+    label = f"{app}:{job.job_id}" if job is not None else app
+    with (job.stage("ffmpeg") if job else stage_timer(app, "ffmpeg")):
+        scheduled = scheduler.submit(command, priority=priority, threads=threads, memory_mb=memory_mb,
+                                     timeout=timeout, cwd=cwd, label=label, cancel_event=cancel_event)
+        result = scheduled.wait()
+    # Measured from admission, so time spent queued doesn't skew the realtime factor
+    elapsed = time.monotonic() - scheduled.started_at
+    media_seconds = parse_media_seconds(result.stderr)
+    if recorder is not None:
+        recorder(command, result, scheduled)
+
+    if job is not None:
+        job.set_result(command, result, media_seconds=media_seconds, output_path=output_path)
+
+    if result.returncode == 0:
+        if media_seconds and elapsed > 0:
+            FFMPEG_REALTIME_FACTOR.observe(media_seconds / elapsed, app=app)
+        if output_path and os.path.exists(output_path):
+            BYTES_PROCESSED.inc(os.path.getsize(output_path), app=app, stage="ffmpeg_output")
+
+    return result
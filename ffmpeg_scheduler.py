@@ -0,0 +1,440 @@
+"""
+Resource-aware scheduler for FFmpeg processes.
+
+Every FFmpeg run goes through here (via ffmpeg_runner.run_ffmpeg). Jobs are
+admitted only while the CPU and memory budgets allow, get a fixed number of
+threads pinned to their own cores, run niced when they are previews, and
+are killed if they exceed their wall-clock or RSS limit or are cancelled.
+
+The running jobs are recorded in a flock'd state file shared by every
+process on the host (FFMPEG_SCHEDULER_STATE), so several API workers split
+one CPU/memory budget and get disjoint cores.
+"""
+
+import itertools
+import json
+import os
+import re
+import shlex
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import FFMPEG_JOBS_KILLED, FFMPEG_QUEUE_WAIT, FFMPEG_SCHEDULER_JOBS
+from process_info import is_running, start_time
+
+try:
+    import fcntl
+except ImportError:  # Windows: budgets stay per process
+    fcntl = None
+
+PRIORITIES = {"final": 0, "preview": 1}
+PREVIEW_NICENESS = 10
+POLL_INTERVAL = 0.5
+
+_FFMPEG_BINARY = re.compile(r"^(\s*\S*ffmpeg(?:\.exe)?)(?=\s)")
+# FFmpeg options that take no value; every other option consumes the next token
+_FLAG_OPTIONS = {
+    "-y", "-n", "-an", "-vn", "-sn", "-dn", "-hide_banner", "-nostats", "-stats", "-nostdin", "-stdin",
+    "-benchmark", "-benchmark_all", "-shortest", "-copyts", "-re", "-accurate_seek", "-noaccurate_seek",
+    "-start_at_zero", "-ignore_unknown", "-copy_unknown", "-report", "-xerror", "-autorotate", "-noautorotate",
+}
+
+
+def _total_memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return 4096
+
+
+def _available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+CPU_BUDGET = int(os.getenv("FFMPEG_CPU_BUDGET", str(len(_available_cpus()))))
+MEMORY_BUDGET_MB = int(os.getenv("FFMPEG_MEMORY_BUDGET_MB", str(int(_total_memory_mb() * 0.75))))
+DEFAULT_JOB_THREADS = int(os.getenv("FFMPEG_JOB_THREADS", str(max(1, CPU_BUDGET // 2))))
+DEFAULT_JOB_MEMORY_MB = int(os.getenv("FFMPEG_JOB_MEMORY_MB", "1024"))
+DEFAULT_MAX_RSS_MB = int(os.getenv("FFMPEG_MAX_RSS_MB", "0")) or None
+STATE_PATH = os.getenv("FFMPEG_SCHEDULER_STATE", os.path.join(tempfile.gettempdir(), "video_editor_ffmpeg_jobs.json"))
+
+
+class JobCancelled(Exception):
+    """Raised by FFmpegJob.wait() when the job was cancelled"""
+
+
+class ResourceLimitExceeded(Exception):
+    """Raised when a job goes over its RSS limit"""
+
+
+def _process_group_rss_mb(pgid):
+    """Resident memory of every process in a process group (Linux /proc only)"""
+    total_kb = 0
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return None
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # pgrp is the 5th field, after the parenthesised command name
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[2]) != pgid:
+                continue
+            with open(f"/proc/{entry}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, IndexError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+def _output_positions(tokens):
+    """Indexes of the output files in an ffmpeg argument list (positional arguments, `-` for stdout)"""
+    positions = []
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token.startswith("-") and token != "-":
+            i += 1 if token in _FLAG_OPTIONS else 2
+            continue
+        positions.append(i)
+        i += 1
+    return positions
+
+
+def _is_operator(token):
+    return bool(token) and set(token) <= set("();<>|&")
+
+
+def apply_thread_limit(command, threads):
+    """
+    Limit an ffmpeg command to `threads`: -filter_threads/-filter_complex_threads after `ffmpeg`
+    and -threads before each output file, where it binds the encoder (before -i it only sets the decoder).
+    Options the command already sets are left alone.
+    """
+    try:
+        lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return command
+    # Only the ffmpeg invocation itself, up to any shell operator (&&, |, ;, >...)
+    end = next((i for i, token in enumerate(tokens) if _is_operator(token)), len(tokens))
+    if 0 < end < len(tokens) and tokens[end][0] in "<>" and tokens[end - 1].isdigit():
+        # The fd of a redirection such as 2>&1
+        end -= 1
+    args, rest = tokens[:end], tokens[end:]
+    if not args or not _FFMPEG_BINARY.match(args[0] + " "):
+        return command
+
+    if "-threads" not in args:
+        for position in reversed(_output_positions(args)):
+            args[position:position] = ["-threads", str(threads)]
+    global_limits = [option for option in ("-filter_threads", "-filter_complex_threads") if option not in args]
+    for option in reversed(global_limits):
+        args[1:1] = [option, str(threads)]
+    if args == tokens[:end]:
+        return command
+    rest = " ".join(token if _is_operator(token) else shlex.quote(token) for token in rest)
+    # Glue fds back onto their redirection operators
+    rest = re.sub(r"(^|\s)(\d+) (?=[<>])", r"\1\2", rest)
+    return f"{shlex.join(args)} {rest}".rstrip()
+
+
+def apply_benchmark(command):
+    """Add -benchmark after `ffmpeg` so CPU time, real time and peak RSS are printed at exit"""
+    if "-benchmark" in command:
+        return command
+    return _FFMPEG_BINARY.sub(lambda m: f"{m.group(1)} -benchmark", command, count=1)
+
+
+class FFmpegJob:
+    """One queued or running FFmpeg command"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, command, priority, threads, memory_mb, timeout, max_rss_mb, cwd, label, cancel_event=None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {tuple(PRIORITIES)}")
+        self.job_id = next(self._ids)
+        self.command = command
+        self.priority = priority
+        self.threads = threads
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.cwd = cwd
+        self.label = label
+        self.state = "queued"
+        self.cores = []
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.peak_rss_mb = 0
+        self.result = None
+        self.error = None
+        self._process = None
+        self._cancel = cancel_event or threading.Event()
+        self._done = threading.Event()
+
+    def describe(self):
+        return {
+            "job_id": self.job_id,
+            "label": self.label,
+            "state": self.state,
+            "priority": self.priority,
+            "threads": self.threads,
+            "cores": self.cores,
+            "memory_mb": self.memory_mb,
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "running_s": round(time.monotonic() - self.started_at, 1) if self.started_at else None,
+        }
+
+    def cancel(self):
+        self._cancel.set()
+
+    def wait(self):
+        """Block until the job finishes; returns subprocess.CompletedProcess or raises"""
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class FFmpegScheduler:
+    def __init__(self, cpu_budget=CPU_BUDGET, memory_budget_mb=MEMORY_BUDGET_MB, state_path=STATE_PATH):
+        self._cpus = _available_cpus()[:max(1, cpu_budget)]
+        self.cpu_budget = len(self._cpus)
+        self.memory_budget_mb = memory_budget_mb
+        self.state_path = state_path if fcntl is not None else None
+        # Used instead of the state file when there is none
+        self._local_leases = {}
+        self._queue = []
+        self._jobs = {}
+        self._lock = threading.Condition()
+
+    def _update_gauges(self):
+        FFMPEG_SCHEDULER_JOBS.set(len(self._queue), state="queued")
+        FFMPEG_SCHEDULER_JOBS.set(sum(1 for j in self._jobs.values() if j.state == "running"), state="running")
+
+    @contextmanager
+    def _leases(self):
+        """
+        Cores and memory held by the running jobs of every process sharing the state file,
+        {"<pid>:<job id>": lease}; changes made in the block are written back
+        """
+        if not self.state_path:
+            yield self._local_leases
+            return
+        with open(self.state_path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    stored = json.loads(f.read() or "{}")
+                except ValueError:
+                    stored = {}
+                # Jobs of processes that died without releasing them
+                leases = {key: lease for key, lease in stored.items() if is_running(lease["pid"], lease["started"])}
+                yield leases
+                if leases != stored:
+                    f.seek(0)
+                    f.truncate()
+                    json.dump(leases, f)
+                    f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _lease_key(self, job):
+        return f"{os.getpid()}:{job.job_id}"
+
+    def _claim(self, job, leases):
+        """Reserve cores and memory for the job if the shared budget allows; returns whether it did"""
+        used = {core for lease in leases.values() for core in lease["cores"]}
+        free_cores = [core for core in self._cpus if core not in used]
+        free_memory_mb = self.memory_budget_mb - sum(lease["memory_mb"] for lease in leases.values())
+        # An oversized job still runs, but only on an otherwise idle machine
+        if leases and (len(free_cores) < job.threads or free_memory_mb < job.memory_mb):
+            return False
+        job.cores = free_cores[:job.threads]
+        leases[self._lease_key(job)] = {"pid": os.getpid(), "started": start_time(), "cores": job.cores,
+                                        "memory_mb": job.memory_mb}
+        return True
+
+    def _next_in_line(self):
+        return min(self._queue, key=lambda j: (PRIORITIES[j.priority], j.job_id))
+
+    def submit(self, command, priority="final", threads=None, memory_mb=None, timeout=None,
+               max_rss_mb=DEFAULT_MAX_RSS_MB, cwd=None, label=None, cancel_event=None):
+        """
+        Queue a command and return its FFmpegJob; the job runs on a background thread once admitted.
+        Setting cancel_event (a threading.Event) cancels it like cancel() does.
+        """
+        if threads is None:
+            threads = DEFAULT_JOB_THREADS if priority == "final" else max(1, DEFAULT_JOB_THREADS // 2)
+        threads = max(1, min(threads, self.cpu_budget))
+        job = FFmpegJob(command, priority, threads, memory_mb or DEFAULT_JOB_MEMORY_MB,
+                        timeout, max_rss_mb, cwd, label, cancel_event)
+        with self._lock:
+            self._queue.append(job)
+            self._jobs[job.job_id] = job
+            self._update_gauges()
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def run(self, command, **kwargs):
+        """Submit and wait; returns subprocess.CompletedProcess"""
+        return self.submit(command, **kwargs).wait()
+
+    def jobs(self):
+        with self._lock:
+            return [job.describe() for job in self._jobs.values()]
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.cancel()
+            self._lock.notify_all()
+            return True
+
+    def _acquire(self, job):
+        with self._lock:
+            # Other processes' jobs finish without notifying us: re-check the shared state every poll
+            claimed = False
+            while not claimed and not job._cancel.is_set():
+                if self._next_in_line() is job:
+                    with self._leases() as leases:
+                        claimed = self._claim(job, leases)
+                if not claimed:
+                    self._lock.wait(POLL_INTERVAL)
+            self._queue.remove(job)
+            if not claimed:
+                self._jobs.pop(job.job_id, None)
+                self._update_gauges()
+                return False
+            job.state = "running"
+            job.started_at = time.monotonic()
+            self._update_gauges()
+        FFMPEG_QUEUE_WAIT.observe(job.started_at - job.submitted_at, priority=job.priority)
+        return True
+
+    def _release(self, job):
+        with self._lock:
+            with self._leases() as leases:
+                leases.pop(self._lease_key(job), None)
+            self._jobs.pop(job.job_id, None)
+            self._update_gauges()
+            self._lock.notify_all()
+
+    def _argv(self, job, command):
+        """
+        Run the shell command under `nice`/`taskset`, so ffmpeg and anything else the shell starts
+        inherit the job's priority and cores (no preexec_fn: unsafe to fork with it from a threaded process)
+        """
+        prefix = []
+        if job.priority == "preview" and shutil.which("nice"):
+            prefix += ["nice", "-n", str(PREVIEW_NICENESS)]
+        if job.cores and shutil.which("taskset"):
+            prefix += ["taskset", "-c", ",".join(map(str, job.cores))]
+        return prefix + ["/bin/sh", "-c", command]
+
+    def _kill(self, process):
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _run(self, job):
+        try:
+            if not self._acquire(job):
+                job.state = "cancelled"
+                job.error = JobCancelled(f"FFmpeg job {job.job_id} was cancelled before it started")
+                return
+            try:
+                job.result = self._execute(job)
+                job.state = "finished"
+            except Exception as e:
+                job.state = "failed"
+                job.error = e
+            finally:
+                self._release(job)
+        finally:
+            job._done.set()
+
+    def _execute(self, job):
+        command = apply_thread_limit(job.command, job.threads)
+        posix = os.name == "posix"
+        process = subprocess.Popen(
+            self._argv(job, command) if posix else command,
+            shell=not posix,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=job.cwd or os.getcwd(),
+            start_new_session=posix
+        )
+        job._process = process
+
+        stopped = None
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if stopped:
+                continue
+
+            elapsed = time.monotonic() - job.started_at
+            if job._cancel.is_set():
+                stopped = "cancelled"
+            elif job.timeout and elapsed > job.timeout:
+                stopped = "timeout"
+            elif job.max_rss_mb and posix:
+                rss = _process_group_rss_mb(process.pid)
+                if rss is not None:
+                    job.peak_rss_mb = max(job.peak_rss_mb, rss)
+                    if rss > job.max_rss_mb:
+                        stopped = "rss"
+            if stopped:
+                FFMPEG_JOBS_KILLED.inc(reason=stopped)
+                self._kill(process)
+
+        if stopped == "cancelled":
+            raise JobCancelled(f"FFmpeg job {job.job_id} was cancelled")
+        if stopped == "timeout":
+            raise subprocess.TimeoutExpired(command, job.timeout, output=stdout, stderr=stderr)
+        if stopped == "rss":
+            raise ResourceLimitExceeded(
+                f"FFmpeg job {job.job_id} used {job.peak_rss_mb:.0f} MB RSS (limit {job.max_rss_mb} MB)"
+            )
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FFmpegScheduler()
+        return _scheduler
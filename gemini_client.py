@@ -0,0 +1,57 @@
+"""
+Lazily imported and configured Gemini SDK.
+
+`google.generativeai` pulls in grpc/protobuf and takes a noticeable share of
+process start-up, so it is only imported the first time a model is needed
+(or by an explicit warm-up once the server is already accepting requests).
+"""
+
+import os
+import threading
+
+_lock = threading.Lock()
+_genai = None
+_models = {}
+_state = "cold"
+_error = None
+
+
+def get_genai(api_key=None):
+    """Import and configure google.generativeai on first use"""
+    global _genai, _state, _error
+    if _genai is not None:
+        return _genai
+    with _lock:
+        if _genai is None:
+            _state = "warming"
+            try:
+                import google.generativeai as genai
+                genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+            except Exception as e:
+                _state = "failed"
+                _error = str(e)
+                raise
+            _genai = genai
+            _state = "ready"
+            _error = None
+    return _genai
+
+
+def get_model(model_name, api_key=None):
+    """Return a cached GenerativeModel, creating the client if needed"""
+    genai = get_genai(api_key)
+    with _lock:
+        model = _models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            _models[model_name] = model
+    return model
+
+
+def state():
+    """'cold', 'warming', 'ready' or 'failed'"""
+    return _state
+
+
+def last_error():
+    return _error
@@ -0,0 +1,213 @@
+"""
+Registry of uploaded Gemini files, keyed by content hash.
+
+Uploading a video and waiting for Gemini to finish PROCESSING it dominates
+analysis time, so the remote file is kept and reused for every later prompt
+about the same content (different analysis options, the API and Streamlit
+re-analysing the same upload...). A background reaper deletes files that
+have been idle for a while or are close to Gemini's own expiry, and whatever
+is left is deleted when the process exits.
+"""
+
+import atexit
+import datetime
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import gemini_client
+from metrics import BYTES_PROCESSED, GEMINI_FILES
+
+IDLE_SECONDS = int(os.getenv("GEMINI_FILE_IDLE_SECONDS", "1800"))
+# Gemini keeps uploaded files for 48 hours; don't hand out one about to expire
+DEFAULT_LIFETIME_SECONDS = 48 * 3600
+EXPIRY_MARGIN_SECONDS = 600
+REAP_INTERVAL_SECONDS = 60
+
+
+class GeminiFileError(Exception):
+    """Raised when Gemini fails to process an uploaded file"""
+
+
+class UploadCancelled(Exception):
+    """Raised by prefetch() when its cancel event is set before the file is ready"""
+
+
+def _expires_at(file_obj):
+    expiration = getattr(file_obj, "expiration_time", None)
+    if isinstance(expiration, datetime.datetime):
+        return expiration.timestamp()
+    return time.time() + DEFAULT_LIFETIME_SECONDS
+
+
+class _Entry:
+    def __init__(self, file_obj, owner=None):
+        self.file_obj = file_obj
+        self.expires_at = _expires_at(file_obj)
+        self.last_used = time.time()
+        self.in_use = 0
+        # Set while only the prefetch that uploaded the file has touched it; None once shared
+        self.owner = owner
+
+    def usable(self, now):
+        return self.expires_at - now > EXPIRY_MARGIN_SECONDS
+
+    def reapable(self, now):
+        return self.in_use == 0 and (now - self.last_used > IDLE_SECONDS or not self.usable(now))
+
+
+class GeminiFileRegistry:
+    def __init__(self, app):
+        self.app = app
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def _key_lock(self, content_hash):
+        with self._lock:
+            return self._key_locks.setdefault(content_hash, threading.Lock())
+
+    def _upload(self, path, job, poll_interval, cancel_event=None):
+        genai = gemini_client.get_genai()
+        cancel_event = cancel_event or threading.Event()
+        with job.stage("gemini_upload"):
+            file_obj = genai.upload_file(path=path)
+        BYTES_PROCESSED.inc(os.path.getsize(path), app=job.app, stage="gemini_upload")
+
+        with job.stage("gemini_processing"):
+            while file_obj.state.name == "PROCESSING" and not cancel_event.wait(poll_interval):
+                file_obj = genai.get_file(file_obj.name)
+
+        if cancel_event.is_set():
+            self._delete(file_obj)
+            raise UploadCancelled("Upload cancelled")
+        if file_obj.state.name == "FAILED":
+            self._delete(file_obj)
+            raise GeminiFileError("Gemini failed to process the video")
+        return file_obj
+
+    def _delete(self, file_obj):
+        try:
+            gemini_client.get_genai().delete_file(file_obj.name)
+        except Exception:
+            # Already gone or unreachable: Gemini expires it on its own
+            pass
+
+    def _acquire(self, content_hash, path, job, poll_interval, cancel_event=None, owner=None):
+        """Registered entry for this content (uploading it if needed), marked in use"""
+        with self._key_lock(content_hash):
+            now = time.time()
+            with self._lock:
+                entry = self._entries.get(content_hash)
+                stale = None
+                if entry is not None and not entry.usable(now):
+                    del self._entries[content_hash]
+                    stale, entry = entry, None
+                elif entry is not None:
+                    # Claimed under the same lock forget() checks, so it can't be deleted from under us
+                    entry.in_use += 1
+                    entry.owner = None
+            if stale is not None and stale.in_use == 0:
+                self._delete(stale.file_obj)
+
+            if entry is None:
+                GEMINI_FILES.inc(app=self.app, outcome="upload")
+                entry = _Entry(self._upload(path, job, poll_interval, cancel_event), owner)
+                entry.in_use = 1
+                with self._lock:
+                    self._entries[content_hash] = entry
+                self._start_reaper()
+            else:
+                GEMINI_FILES.inc(app=self.app, outcome="reuse")
+        return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry.in_use -= 1
+            entry.last_used = time.time()
+
+    @contextmanager
+    def use(self, content_hash, path, job, poll_interval=5):
+        """
+        Yield an ACTIVE Gemini file for this content, uploading it only if no live handle exists.
+        The handle is not reaped while the block runs.
+        """
+        entry = self._acquire(content_hash, path, job, poll_interval)
+        try:
+            yield entry.file_obj
+        finally:
+            self._release(entry)
+
+    def prefetch(self, content_hash, path, job, poll_interval=5, cancel_event=None, owner=None):
+        """
+        Upload ahead of time so a later use() finds the handle ready.
+        A use() for the same content while this runs waits for it instead of uploading again.
+        If this call uploads the file, `owner` may later forget() it (until anyone else uses it).
+        """
+        self._release(self._acquire(content_hash, path, job, poll_interval, cancel_event, owner))
+
+    def has(self, content_hash):
+        """True if a usable handle is already registered for this content"""
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            return entry is not None and entry.usable(time.time())
+
+    def forget(self, content_hash, owner=None):
+        """
+        Delete the remote file for this content now (if it isn't in use). With an owner, only a file
+        that owner uploaded and nobody else has used is deleted; shared files are left to the reaper.
+        """
+        with self._lock:
+            entry = self._entries.get(content_hash)
+            if entry is None or entry.in_use or (owner is not None and entry.owner is not owner):
+                return False
+            del self._entries[content_hash]
+        self._delete(entry.file_obj)
+        return True
+
+    def reap(self):
+        """Delete idle and near-expiry handles; returns how many were removed"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, entry in self._entries.items() if entry.reapable(now)]
+            removed = [self._entries.pop(key) for key in expired]
+        for entry in removed:
+            self._delete(entry.file_obj)
+        return len(removed)
+
+    def release_all(self):
+        """Delete every handle not currently in use (process shutdown, end of a batch run)"""
+        self._stop.set()
+        with self._lock:
+            idle = [key for key, entry in self._entries.items() if entry.in_use == 0]
+            removed = [self._entries.pop(key) for key in idle]
+        for entry in removed:
+            self._delete(entry.file_obj)
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="gemini-file-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stop.wait(REAP_INTERVAL_SECONDS):
+            self.reap()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(app="gemini"):
+    """Process-wide registry; remaining files are deleted at exit"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = GeminiFileRegistry(app)
+            atexit.register(_registry.release_all)
+        return _registry
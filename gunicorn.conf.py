@@ -0,0 +1,8 @@
+"""Gunicorn settings for the API (see the Dockerfile CMD)"""
+
+
+def on_starting(server):
+    # Snapshots left by the previous run's workers would otherwise be added to the new totals
+    from metrics import clear_shared
+
+    clear_shared()
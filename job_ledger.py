@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Append-only JSONL job ledger and offline performance report.
+
+Every job (API analysis, Streamlit analysis/render, batch run) appends one
+compact JSON line: input hash, wall-clock duration, stage timings, FFmpeg
+command, return code and a truncated stderr tail. The file rotates by size.
+
+Usage:
+    python job_ledger.py stats [--ledger logs/jobs.jsonl] [--bucket hour|day]
+"""
+
+import argparse
+import json
+import os
+import re
+import shlex
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from ffmpeg_filters import split_graph
+from metrics import stage_timer
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+DEFAULT_LEDGER_PATH = os.getenv("JOB_LEDGER_PATH", os.path.join("logs", "jobs.jsonl"))
+DEFAULT_MAX_BYTES = int(os.getenv("JOB_LEDGER_MAX_BYTES", str(50 * 1024 * 1024)))
+DEFAULT_BACKUP_COUNT = int(os.getenv("JOB_LEDGER_BACKUP_COUNT", "5"))
+STDERR_TAIL_CHARS = 2000
+
+_FILTER_OPTIONS = ("-vf", "-af", "-filter_complex", "-lavfi", "-filter:v", "-filter:a")
+
+
+def extract_filters(command):
+    """Return the sorted set of filter names used in an FFmpeg command"""
+    if not command:
+        return []
+    try:
+        tokens = shlex.split(command)
+    except ValueError:
+        tokens = command.split()
+
+    names = set()
+    for option, value in zip(tokens, tokens[1:]):
+        if option not in _FILTER_OPTIONS:
+            continue
+        for part in split_graph(value):
+            part = re.sub(r"\[[^\]]*\]", "", part).strip()
+            name = part.split("=", 1)[0].strip()
+            if name:
+                names.add(name)
+    return sorted(names)
+
+
+class JobRecord:
+    """Collects stage timings and outcome for one job"""
+
+    def __init__(self, app, input_name, job_id=None):
+        self.app = app
+        self.job_id = job_id or uuid.uuid4().hex
+        self.input_name = input_name
+        self.input_hash = None
+        self.input_bytes = None
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.stages = {}
+        # (stage, start, end) offsets from the job start, for profiling bundles
+        self.timeline = []
+        self.command = None
+        self.return_code = None
+        self.stderr_tail = None
+        self.media_seconds = None
+        self.output_bytes = None
+        self.error = None
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage for both the ledger record and the Prometheus metrics"""
+        start = time.perf_counter()
+        try:
+            with stage_timer(self.app, name):
+                yield
+        finally:
+            end = time.perf_counter()
+            self.stages[name] = round(self.stages.get(name, 0) + end - start, 4)
+            self.timeline.append((name, round(start - self._start, 4), round(end - self._start, 4)))
+
+    def set_input(self, input_hash, input_bytes):
+        self.input_hash = input_hash
+        self.input_bytes = input_bytes
+
+    def set_result(self, command, result=None, media_seconds=None, output_path=None):
+        """Store the FFmpeg command and, if it was run, its outcome"""
+        self.command = command
+        if result is not None:
+            self.return_code = result.returncode
+            if result.returncode != 0 and result.stderr:
+                self.stderr_tail = result.stderr[-STDERR_TAIL_CHARS:]
+        self.media_seconds = media_seconds
+        if output_path and os.path.exists(output_path):
+            self.output_bytes = os.path.getsize(output_path)
+
+    def to_dict(self):
+        status = "error" if self.error or (self.return_code not in (None, 0)) else "success"
+        record = {
+            "ts": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec="seconds"),
+            "job_id": self.job_id,
+            "app": self.app,
+            "status": status,
+            "input_name": self.input_name,
+            "input_hash": self.input_hash,
+            "input_bytes": self.input_bytes,
+            "duration_s": round(time.perf_counter() - self._start, 4),
+            "stages": self.stages,
+            "command": self.command,
+            "filters": extract_filters(self.command),
+            "return_code": self.return_code,
+            "stderr_tail": self.stderr_tail,
+            "media_s": self.media_seconds,
+            "output_bytes": self.output_bytes,
+            "error": self.error,
+        }
+        return {key: value for key, value in record.items() if value not in (None, [], {})}
+
+
+class JobLedger:
+    """Size-rotated JSONL file, safe to append to from several workers"""
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rotate(self):
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def append(self, record):
+        if isinstance(record, JobRecord):
+            record = record.to_dict()
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+        with self._file_lock():
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def files(self):
+        """Ledger files from oldest to newest"""
+        paths = [f"{self.path}.{i}" for i in range(self.backup_count, 0, -1)]
+        paths.append(self.path)
+        return [path for path in paths if os.path.exists(path)]
+
+    def read(self):
+        for path in self.files():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+
+_default_ledger = None
+
+
+def get_ledger():
+    """Process-wide ledger at JOB_LEDGER_PATH"""
+    global _default_ledger
+    if _default_ledger is None:
+        _default_ledger = JobLedger()
+    return _default_ledger
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def compute_stats(records, bucket="hour"):
+    """Aggregate ledger records into stage percentiles, filter failure rates and throughput"""
+    stage_values = defaultdict(list)
+    filter_counts = defaultdict(lambda: {"jobs": 0, "failures": 0})
+    throughput = defaultdict(lambda: {"jobs": 0, "failures": 0, "input_bytes": 0, "media_s": 0.0})
+    bucket_format = "%Y-%m-%dT%H:00" if bucket == "hour" else "%Y-%m-%d"
+
+    for record in records:
+        failed = record.get("status") == "error"
+        for stage, seconds in record.get("stages", {}).items():
+            stage_values[stage].append(seconds)
+        stage_values["total"].append(record.get("duration_s", 0))
+
+        if "return_code" in record:
+            for name in record.get("filters") or ["(none)"]:
+                filter_counts[name]["jobs"] += 1
+                filter_counts[name]["failures"] += int(failed)
+
+        try:
+            ts = datetime.fromisoformat(record["ts"])
+        except (KeyError, ValueError):
+            continue
+        slot = throughput[ts.strftime(bucket_format)]
+        slot["jobs"] += 1
+        slot["failures"] += int(failed)
+        slot["input_bytes"] += record.get("input_bytes", 0)
+        slot["media_s"] += record.get("media_s", 0)
+
+    stages = {
+        stage: {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+        }
+        for stage, values in sorted(stage_values.items())
+    }
+    filters = {
+        name: dict(counts, failure_rate=counts["failures"] / counts["jobs"])
+        for name, counts in sorted(filter_counts.items())
+    }
+    return {"stages": stages, "filters": filters, "throughput": dict(sorted(throughput.items()))}
+
+
+def print_stats(stats):
+    print("Stage latency (seconds)")
+    print(f"{'stage':<20}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, row in stats["stages"].items():
+        print(f"{stage:<20}{row['count']:>8}{row['p50']:>10.2f}{row['p95']:>10.2f}{row['p99']:>10.2f}")
+
+    print("\nFailure rate by filter")
+    print(f"{'filter':<20}{'jobs':>8}{'failed':>8}{'rate':>8}")
+    for name, row in stats["filters"].items():
+        print(f"{name:<20}{row['jobs']:>8}{row['failures']:>8}{row['failure_rate']:>8.1%}")
+
+    print("\nThroughput")
+    print(f"{'period':<18}{'jobs':>6}{'failed':>8}{'input MB':>12}{'media min':>11}")
+    for period, row in stats["throughput"].items():
+        print(f"{period:<18}{row['jobs']:>6}{row['failures']:>8}"
+              f"{row['input_bytes'] / (1024 * 1024):>12.1f}{row['media_s'] / 60:>11.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Video editor job ledger tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    stats_parser = subparsers.add_parser("stats", help="Per-stage percentiles, failure rates and throughput")
+    stats_parser.add_argument("--ledger", default=DEFAULT_LEDGER_PATH, help="Path to the JSONL ledger")
+    stats_parser.add_argument("--bucket", choices=["hour", "day"], default="hour", help="Throughput bucket size")
+    stats_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    ledger = JobLedger(args.ledger)
+    stats = compute_stats(ledger.read(), bucket=args.bucket)
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print_stats(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Opt-in per-job profiling bundles.
+
+A profiled job records, in one zip under JOB_PROFILE_DIR named by job id:
+- a cProfile of the orchestration thread (python.prof for pstats/snakeviz,
+  plus the top functions as python.txt)
+- every FFmpeg command run from that thread, with -benchmark CPU/real time,
+  peak RSS, queue wait, cores and the full stderr (ffmpeg/NN.log)
+- per-filter timing: the job's filter chains re-run on the first
+  FILTER_SAMPLE_SECONDS of the input, one filter added at a time, so each
+  filter's CPU cost is the difference to the chain before it
+- the job's stage timeline (start/end offsets) and its ledger record
+
+Usage:
+    python job_profiling.py show <job_id | bundle.zip>
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import re
+import shlex
+import time
+import zipfile
+
+from ffmpeg_filters import split_filters
+from ffmpeg_runner import set_run_recorder
+from ffmpeg_scheduler import apply_benchmark, get_scheduler
+
+PROFILE_DIR = os.getenv("JOB_PROFILE_DIR", os.path.join("logs", "profiles"))
+FILTER_SAMPLE_SECONDS = float(os.getenv("JOB_PROFILE_FILTER_SECONDS", "30"))
+TOP_FUNCTIONS = 40
+STDERR_MAX_CHARS = 256 * 1024
+
+_BENCH_PATTERN = re.compile(r"bench: utime=([\d.]+)s stime=([\d.]+)s rtime=([\d.]+)s")
+_MAXRSS_PATTERN = re.compile(r"bench: maxrss=(\d+)\s*(?:KiB|kB)")
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+_CHAIN_OPTIONS = {"-vf": "video", "-filter:v": "video", "-af": "audio", "-filter:a": "audio",
+                  "-filter_complex": "complex", "-lavfi": "complex"}
+
+
+def parse_benchmark(stderr):
+    """CPU and real seconds (and peak RSS) from ffmpeg's -benchmark lines, or None"""
+    match = _BENCH_PATTERN.search(stderr or "")
+    if not match:
+        return None
+    user, system, real = (float(value) for value in match.groups())
+    bench = {"utime_s": user, "stime_s": system, "cpu_s": round(user + system, 3), "rtime_s": real}
+    maxrss = _MAXRSS_PATTERN.search(stderr)
+    if maxrss:
+        bench["maxrss_mb"] = round(int(maxrss.group(1)) / 1024, 1)
+    return bench
+
+
+def _parse_command(command):
+    """Inputs, filter chains and -map values of an FFmpeg command"""
+    try:
+        tokens = shlex.split(command)
+    except ValueError:
+        return [], [], []
+    inputs, chains, maps = [], [], []
+    for option, value in zip(tokens, tokens[1:]):
+        if option == "-i":
+            inputs.append(value)
+        elif option in _CHAIN_OPTIONS:
+            chains.append((_CHAIN_OPTIONS[option], value))
+        elif option == "-map":
+            maps.append(value)
+    return inputs, chains, maps
+
+
+def _timed_run(input_args, output_args, seconds):
+    """Run a decode/filter-only pass on the scheduler and return its benchmark"""
+    args = ["ffmpeg", "-hide_banner", "-nostats", "-y"]
+    for path in input_args:
+        args += ["-t", f"{seconds:g}", "-i", path]
+    command = apply_benchmark(shlex.join(args + output_args + ["-f", "null", "-"]))
+    result = get_scheduler().run(command, priority="preview")
+    bench = parse_benchmark(result.stderr)
+    if result.returncode != 0 or bench is None:
+        raise RuntimeError((result.stderr or "")[-500:])
+    return bench
+
+
+def _time_chain(kind, chain, inputs, maps, seconds):
+    if kind == "complex":
+        baseline = _timed_run(inputs, ["-map", "0"], seconds)
+        graph_args = ["-filter_complex", chain] + [arg for value in maps for arg in ("-map", value)]
+        steps = [(chain, _timed_run(inputs, graph_args, seconds))]
+    else:
+        stream, option, drop = ("0:v:0", "-vf", "-an") if kind == "video" else ("0:a:0", "-af", "-vn")
+        base_args = ["-map", stream, drop]
+        baseline = _timed_run(inputs[:1], base_args + [option, "null" if kind == "video" else "anull"], seconds)
+        filters = split_filters(chain)
+        steps = [(name, _timed_run(inputs[:1], base_args + [option, ",".join(filters[:i + 1])], seconds))
+                 for i, name in enumerate(filters)]
+
+    timings = []
+    previous = baseline
+    for name, bench in steps:
+        timings.append({
+            "chain": kind,
+            "filter": name,
+            "cpu_s": round(max(0.0, bench["cpu_s"] - previous["cpu_s"]), 3),
+            "rtime_s": round(max(0.0, bench["rtime_s"] - previous["rtime_s"]), 3),
+        })
+        if kind != "complex":
+            previous = bench
+    return timings
+
+
+def time_filters(command, seconds=FILTER_SAMPLE_SECONDS):
+    """
+    Per-filter CPU cost of a command's -vf/-af chains (cumulative prefixes over a sample of the input);
+    a -filter_complex graph is timed as a whole against a plain decode
+    """
+    inputs, chains, maps = _parse_command(command)
+    if not inputs or not all(os.path.exists(path) for path in inputs):
+        return {"filters": [], "errors": [{"error": "Input files not found"}]}
+
+    timings, errors = [], []
+    for kind, chain in chains:
+        try:
+            timings += _time_chain(kind, chain, inputs, maps, seconds)
+        except RuntimeError as e:
+            errors.append({"chain": kind, "filters": chain, "error": str(e)})
+    return {"sample_seconds": seconds, "filters": timings, "errors": errors}
+
+
+def profile_path(job_id):
+    """Bundle path for a job id, or None if it isn't one"""
+    if not _JOB_ID.fullmatch(job_id or ""):
+        return None
+    return os.path.join(PROFILE_DIR, f"{job_id}.zip")
+
+
+class JobProfiler:
+    """Collects the profiling data for one job_ledger.JobRecord in the calling thread"""
+
+    def __init__(self, job):
+        self.job = job
+        self.runs = []
+        self.filter_timings = []
+        self.python_error = None
+        self.path = None
+        self._profile = cProfile.Profile()
+        self._profiling = False
+
+    def start(self):
+        try:
+            self._profile.enable()
+            self._profiling = True
+        except ValueError as e:
+            # Another profiler (a debugger, a second profiled job in this thread) is active
+            self.python_error = str(e)
+        set_run_recorder(self._record_run)
+        return self
+
+    def _record_run(self, command, result, scheduled):
+        self.runs.append({
+            "command": command,
+            "return_code": result.returncode,
+            "queue_wait_s": round(scheduled.started_at - scheduled.submitted_at, 3),
+            "benchmark": parse_benchmark(result.stderr),
+            "scheduler": scheduled.describe(),
+            "stderr": (result.stderr or "")[-STDERR_MAX_CHARS:],
+        })
+
+    def time_filters(self, command, seconds=FILTER_SAMPLE_SECONDS):
+        """Add per-filter timings for a command the job ran (or would run)"""
+        try:
+            timings = time_filters(command, seconds)
+        except Exception as e:
+            timings = {"filters": [], "errors": [{"error": str(e)}]}
+        self.filter_timings.append(dict(timings, command=command))
+
+    def finish(self):
+        """Stop profiling and write the bundle; returns its path"""
+        if self.path is not None:
+            return self.path
+        set_run_recorder(None)
+        if self._profiling:
+            self._profile.disable()
+
+        summary = {
+            "job": self.job.to_dict(),
+            "created": time.time(),
+            "timeline": [{"stage": name, "start_s": start, "end_s": end} for name, start, end in self.job.timeline],
+            "ffmpeg_runs": [{key: value for key, value in run.items() if key != "stderr"} for run in self.runs],
+            "filter_timings": self.filter_timings,
+            "python_profile": self.python_error or "python.prof",
+        }
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = profile_path(self.job.job_id) or os.path.join(PROFILE_DIR, f"{self.job.job_id}.zip")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as bundle:
+            bundle.writestr("profile.json", json.dumps(summary, indent=2, default=str))
+            for index, run in enumerate(self.runs, 1):
+                bundle.writestr(f"ffmpeg/{index:02d}.log", f"$ {run['command']}\n\n{run['stderr']}")
+            if self._profiling and self._profile.getstats():
+                # Same format Stats.dump_stats writes: load with pstats.Stats("python.prof")
+                bundle.writestr("python.prof", marshal.dumps(pstats.Stats(self._profile).stats))
+                text = io.StringIO()
+                pstats.Stats(self._profile, stream=text).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+                bundle.writestr("python.txt", text.getvalue())
+        os.replace(tmp_path, path)
+        self.path = path
+        return path
+
+
+def load_summary(job_id_or_path):
+    path = job_id_or_path if job_id_or_path.endswith(".zip") else profile_path(job_id_or_path)
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError(f"No profile bundle for {job_id_or_path}")
+    with zipfile.ZipFile(path) as bundle:
+        return json.loads(bundle.read("profile.json"))
+
+
+def print_summary(summary):
+    job = summary["job"]
+    print(f"Job {job['job_id']} ({job.get('input_name')}): {job['status']}, {job['duration_s']:.1f}s")
+
+    print("\nStage timeline (seconds from job start)")
+    for entry in summary["timeline"]:
+        print(f"{entry['stage']:<24}{entry['start_s']:>10.2f}{entry['end_s']:>10.2f}"
+              f"{entry['end_s'] - entry['start_s']:>10.2f}")
+
+    print("\nFFmpeg runs")
+    for run in summary["ffmpeg_runs"]:
+        bench = run["benchmark"] or {}
+        print(f"rc={run['return_code']} queued {run['queue_wait_s']:.1f}s, real {bench.get('rtime_s', '?')}s, "
+              f"cpu {bench.get('cpu_s', '?')}s, maxrss {bench.get('maxrss_mb', '?')} MB")
+        print(f"  {run['command'][:160]}")
+
+    for timing in summary["filter_timings"]:
+        print(f"\nFilter timing over {timing.get('sample_seconds', '?')}s of input")
+        for error in timing.get("errors", []):
+            print(f"  {error.get('chain', '')} failed: {error['error'][-200:]}")
+        for row in sorted(timing["filters"], key=lambda r: r["cpu_s"], reverse=True):
+            print(f"  {row['chain']:<8}{row['cpu_s']:>8.2f}s cpu {row['rtime_s']:>8.2f}s real  {row['filter'][:80]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect per-job profiling bundles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show_parser = subparsers.add_parser("show", help="Print a bundle's timeline, FFmpeg runs and filter timings")
+    show_parser.add_argument("job", help="Job id or path to a bundle zip")
+    args = parser.parse_args(argv)
+
+    try:
+        print_summary(load_summary(args.job))
+    except FileNotFoundError as e:
+        print(e)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
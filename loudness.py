@@ -0,0 +1,97 @@
+"""
+Two-pass EBU R128 loudness normalization with a cached measurement pass.
+
+The first pass runs loudnorm in analysis mode over the audio only and is
+stored per content hash, so it happens once per video no matter how many
+times it is re-rendered or how many renditions are written. The second pass
+is just a linear loudnorm filter built from those numbers, added to the
+audio chain of the normal single-pass render (see renditions.py).
+"""
+
+import json
+import os
+import re
+import shlex
+
+from content_hash import file_sha256
+from ffmpeg_runner import run_ffmpeg
+from video_join import probe_clip
+
+CACHE_DIR = os.getenv("LOUDNESS_CACHE_DIR", os.path.join("cache", "loudness"))
+TARGET = {
+    "I": float(os.getenv("LOUDNESS_TARGET_LUFS", "-16")),
+    "TP": float(os.getenv("LOUDNESS_TARGET_TP", "-1.5")),
+    "LRA": float(os.getenv("LOUDNESS_TARGET_LRA", "11")),
+}
+OUTPUT_SAMPLE_RATE = 48000
+
+# One-pass normalizers the AI sometimes adds; replaced when the measured filter is applied
+REPLACED_FILTERS = ["loudnorm", "dynaudnorm", "speechnorm"]
+
+_JSON_BLOCK = re.compile(r"\{[^{}]*\"input_i\"[^{}]*\}", re.DOTALL)
+
+
+class LoudnessError(Exception):
+    """Raised when the measurement pass fails"""
+
+
+def _target_args(target):
+    return f"I={target['I']:g}:TP={target['TP']:g}:LRA={target['LRA']:g}"
+
+
+def _cache_path(content_hash):
+    return os.path.join(CACHE_DIR, f"{content_hash}.json")
+
+
+def measure_loudness(path, app="loudness", target=None, cancel_event=None):
+    """
+    Integrated loudness, true peak, LRA and threshold of the first audio stream, cached per
+    content hash: {"input_i", "input_tp", "input_lra", "input_thresh", "target_offset", "target"}.
+    Returns None for videos without audio.
+    """
+    target = target or TARGET
+    content_hash = file_sha256(path)
+    cache_path = _cache_path(content_hash)
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cached = json.load(f)
+        # The offset depends on the target, so a different target needs a new measurement
+        if cached is None or cached.get("target") == target:
+            return cached
+
+    stats = None
+    if probe_clip(path)["signature"]["audio_codec"] is not None:
+        # Audio only: the measurement pass doesn't decode any video
+        command = shlex.join(["ffmpeg", "-hide_banner", "-nostats", "-i", path, "-map", "0:a:0", "-vn",
+                              "-af", f"loudnorm={_target_args(target)}:print_format=json", "-f", "null", "-"])
+        result = run_ffmpeg(command, app, priority="preview", cancel_event=cancel_event)
+        match = _JSON_BLOCK.search(result.stderr or "")
+        if result.returncode != 0 or not match:
+            raise LoudnessError(f"Loudness measurement failed: {(result.stderr or '')[-500:]}")
+        measured = json.loads(match.group(0))
+        stats = {key: float(measured[key]) for key in
+                 ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")}
+        stats["target"] = target
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(stats, f)
+    os.replace(tmp_path, cache_path)
+    return stats
+
+
+def loudnorm_filter(stats):
+    """Second-pass loudnorm using the measured values; linear mode keeps the dynamics untouched"""
+    # Digital silence measures as -inf/-70 and makes loudnorm fall back to dynamic mode anyway
+    if stats is None or stats["input_i"] <= -70:
+        return None
+    target = stats["target"]
+    return (
+        f"loudnorm={_target_args(target)}"
+        f":measured_I={stats['input_i']:g}:measured_TP={stats['input_tp']:g}"
+        f":measured_LRA={stats['input_lra']:g}:measured_thresh={stats['input_thresh']:g}"
+        f":offset={stats['target_offset']:g}:linear=true:print_format=none"
+        # loudnorm works at 192 kHz internally
+        f",aresample={OUTPUT_SAMPLE_RATE}"
+    )
@@ -0,0 +1,408 @@
+"""
+Lightweight Prometheus-format metrics for the video editor.
+
+Keeps counters, gauges and histograms in-process and renders them in the
+Prometheus text exposition format, so the API can serve them on /metrics and
+the Streamlit app / batch script can expose or dump them without extra
+dependencies.
+
+With several worker processes (gunicorn --workers N), set
+PROMETHEUS_MULTIPROC_DIR to a directory shared by the workers: each worker
+writes its values there every few seconds and /metrics on any worker adds
+them all up, so counters don't appear to reset between scrapes.
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from process_info import is_running, start_time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket layouts (seconds / bytes / ratio)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+SIZE_BUCKETS = (1e5, 1e6, 1e7, 5e7, 1e8, 5e8, 1e9, 5e9)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+SYNC_INTERVAL_SECONDS = float(os.getenv("METRICS_SYNC_SECONDS", "5"))
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Metric:
+    """Base class holding one value per label combination"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def export(self):
+        """JSON-friendly [[label values], value] pairs, for sharing with other worker processes"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def _add(self, total, value):
+        return (total or 0) + value
+
+    def _samples(self, values):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+    def render(self, others=()):
+        """Text exposition of this process's values plus any exported by other workers"""
+        values = {tuple(key): value for key, value in self.export()}
+        for exported in others:
+            for key, value in exported:
+                values[tuple(key)] = self._add(values.get(tuple(key)), value)
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        lines.extend(self._samples(values))
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing value"""
+
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (e.g. queue depth)"""
+
+    metric_type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Increment while the block runs, decrement afterwards"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed observations with _sum and _count"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def export(self):
+        with self._lock:
+            return [[list(key), {"counts": list(state["counts"]), "sum": state["sum"], "count": state["count"]}]
+                    for key, state in self._values.items()]
+
+    def _add(self, total, value):
+        if total is None:
+            return value
+        return {
+            "counts": [a + b for a, b in zip(total["counts"], value["counts"])],
+            "sum": total["sum"] + value["sum"],
+            "count": total["count"] + value["count"],
+        }
+
+    def _samples(self, values):
+        lines = []
+        for key, state in sorted(values.items()):
+            counts, total, count = state["counts"], state["sum"], state["count"]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together, optionally shared between worker processes"""
+
+    def __init__(self, multiproc_dir=None):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.multiproc_dir = multiproc_dir
+        if multiproc_dir:
+            os.makedirs(multiproc_dir, exist_ok=True)
+            self._start_sync()
+            os.register_at_fork(after_in_child=self._after_fork)
+            atexit.register(self.write_shared)
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        others = self._read_shared() if self.multiproc_dir else {}
+        return "\n".join(metric.render(others.get(metric.name, ())) for metric in metrics) + "\n"
+
+    def _shared_path(self):
+        # PID plus start time: a restarted worker can get a dead worker's PID back
+        return os.path.join(self.multiproc_dir, f"metrics_{os.getpid()}_{start_time() or 0}.json")
+
+    def write_shared(self):
+        """Write this process's values to the shared directory"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        snapshot = {"pid": os.getpid(), "started": start_time(),
+                    "metrics": {metric.name: metric.export() for metric in metrics}}
+        path = self._shared_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def _read_shared(self):
+        """Values exported by the other workers: {metric name: [exported values, ...]}"""
+        others = {}
+        own_path = self._shared_path()
+        for path in glob.glob(os.path.join(self.multiproc_dir, "metrics_*.json")):
+            if path == own_path:
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # Counters and histograms of a worker that exited still count; its gauges no longer apply
+            alive = is_running(snapshot["pid"], snapshot.get("started"))
+            for name, exported in snapshot["metrics"].items():
+                metric = self._metrics.get(name)
+                if metric is None or (metric.metric_type == "gauge" and not alive):
+                    continue
+                others.setdefault(name, []).append(exported)
+        return others
+
+    def _after_fork(self):
+        # A forked worker (gunicorn --preload) starts from zero: the parent's values are in the parent's own file,
+        # and the parent's sync thread doesn't survive the fork
+        for metric in self._metrics.values():
+            metric._values = {}
+        self._start_sync()
+
+    def _start_sync(self):
+        threading.Thread(target=self._sync_loop, name="metrics-sync", daemon=True).start()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(SYNC_INTERVAL_SECONDS)
+            try:
+                self.write_shared()
+            except OSError:
+                pass
+
+
+REGISTRY = Registry(MULTIPROC_DIR)
+
+# Pipeline metrics shared by api.py, streamlit_video_editor.py and ai_video_editor_simple.py
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "video_editor_stage_duration_seconds",
+    "Wall-clock duration of each pipeline stage",
+    ("app", "stage"),
+))
+STAGE_FAILURES = REGISTRY.register(Counter(
+    "video_editor_stage_failures_total",
+    "Pipeline stages that raised an exception",
+    ("app", "stage"),
+))
+BYTES_PROCESSED = REGISTRY.register(Counter(
+    "video_editor_bytes_processed_total",
+    "Bytes handled per stage (uploaded, written, encoded)",
+    ("app", "stage"),
+))
+INPUT_SIZE = REGISTRY.register(Histogram(
+    "video_editor_input_size_bytes",
+    "Size of input videos",
+    ("app",),
+    buckets=SIZE_BUCKETS,
+))
+JOBS_TOTAL = REGISTRY.register(Counter(
+    "video_editor_jobs_total",
+    "Finished jobs by outcome",
+    ("app", "outcome"),
+))
+JOBS_IN_PROGRESS = REGISTRY.register(Gauge(
+    "video_editor_jobs_in_progress",
+    "Jobs currently being handled (queue depth)",
+    ("app",),
+))
+FFMPEG_REALTIME_FACTOR = REGISTRY.register(Histogram(
+    "video_editor_ffmpeg_realtime_factor",
+    "Seconds of media processed per second of wall-clock time",
+    ("app",),
+    buckets=RATIO_BUCKETS,
+))
+GEMINI_FILES = REGISTRY.register(Counter(
+    "video_editor_gemini_files_total",
+    "Gemini file handles uploaded or reused from the registry",
+    ("app", "outcome"),
+))
+FFMPEG_SCHEDULER_JOBS = REGISTRY.register(Gauge(
+    "video_editor_ffmpeg_scheduler_jobs",
+    "FFmpeg jobs held by the scheduler",
+    ("state",),
+))
+FFMPEG_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "video_editor_ffmpeg_queue_wait_seconds",
+    "Time FFmpeg jobs waited for CPU/memory before starting",
+    ("priority",),
+))
+FFMPEG_JOBS_KILLED = REGISTRY.register(Counter(
+    "video_editor_ffmpeg_jobs_killed_total",
+    "FFmpeg jobs stopped by the scheduler",
+    ("reason",),
+))
+
+
+@contextmanager
+def clear_shared(multiproc_dir=MULTIPROC_DIR):
+    """Remove every worker's snapshot; call once when the server (e.g. the gunicorn master) starts"""
+    if not multiproc_dir:
+        return
+    for path in glob.glob(os.path.join(multiproc_dir, "metrics_*.json*")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def stage_timer(app, stage):
+    """Record the duration of a pipeline stage, counting failures"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_FAILURES.inc(app=app, stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, app=app, stage=stage)
+
+
+def render_latest():
+    """Return the current metrics in Prometheus text format"""
+    return REGISTRY.render()
+
+
+def write_textfile(path):
+    """Atomically write metrics for the node_exporter textfile collector"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render_latest())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_latest().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE_LATEST)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, addr="0.0.0.0"):
+    """Serve /metrics from a daemon thread (for processes without their own web server)"""
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
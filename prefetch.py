@@ -0,0 +1,126 @@
+"""
+Speculative work started as soon as a video is selected in the Streamlit app.
+
+While the user is still looking at the preview, one thread uploads the video
+to Gemini and waits out PROCESSING (via the file registry, so the later
+analysis reuses the handle) and another runs the local pre-analysis: the
+encoding-profile detection, the cut-review timeline and, only when loudness
+normalization is switched on, the loudness measurement (a full-length audio
+decode). Everything is keyed by content hash and cached by the modules that
+do the work, so when the user presses Analyze most of the latency has
+already been paid. Choosing another file cancels whatever is still running.
+"""
+
+import os
+import threading
+
+from encoding_profiles import detect_profile
+from ffmpeg_scheduler import JobCancelled
+from gemini_files import UploadCancelled
+from job_ledger import JobRecord
+from loudness import measure_loudness
+from review_timeline import build_timeline
+
+TASKS = ("gemini", "profile", "timeline", "loudness")
+
+
+class Prefetch:
+    def __init__(self, content_hash, path, filename, app, registry, loudness=False):
+        self.content_hash = content_hash
+        self.path = path
+        self.filename = filename
+        self.app = app
+        self.registry = registry
+        self.job = JobRecord(app, filename)
+        self.job.set_input(content_hash, os.path.getsize(path))
+        self.status = {task: "pending" for task in TASKS}
+        self.errors = {}
+        self.results = {}
+        self._finished = {task: threading.Event() for task in TASKS}
+        self._cancel = threading.Event()
+        self._loudness_requested = loudness
+        self._loudness_started = False
+        self._loudness_lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._remote, name="prefetch-gemini", daemon=True).start()
+        threading.Thread(target=self._local, name="prefetch-local", daemon=True).start()
+        return self
+
+    def _run(self, task, func):
+        if self._cancel.is_set():
+            self.status[task] = "cancelled"
+            self._finished[task].set()
+            return
+        self.status[task] = "running"
+        try:
+            self.results[task] = func()
+            self.status[task] = "done"
+        except (UploadCancelled, JobCancelled):
+            self.status[task] = "cancelled"
+        except Exception as e:
+            self.status[task] = "failed"
+            self.errors[task] = str(e)
+        finally:
+            self._finished[task].set()
+
+    def _remote(self):
+        self._run("gemini", lambda: self.registry.prefetch(
+            self.content_hash, self.path, self.job, cancel_event=self._cancel, owner=self
+        ))
+        if self._cancel.is_set():
+            # This session won't prompt about the video any more; other sessions may still use the file
+            self.registry.forget(self.content_hash, owner=self)
+
+    def _local(self):
+        self._run("profile", lambda: detect_profile(self.path, self.filename, self.app, cancel_event=self._cancel))
+        self._run("timeline", lambda: build_timeline(self.path, app=self.app, cancel_event=self._cancel))
+        self._loudness()
+
+    def _loudness(self):
+        """Measure the loudness if it was asked for, otherwise mark it skipped until request_loudness()"""
+        with self._loudness_lock:
+            if not self._loudness_requested:
+                self.status["loudness"] = "skipped"
+                self._finished["loudness"].set()
+                return
+            if self._loudness_started:
+                return
+            self._loudness_started = True
+            self._finished["loudness"].clear()
+        self._run("loudness", lambda: measure_loudness(self.path, self.app, cancel_event=self._cancel))
+
+    def request_loudness(self):
+        """Also measure the loudness (normalization was switched on); safe to call repeatedly"""
+        with self._loudness_lock:
+            if self._loudness_requested:
+                return
+            self._loudness_requested = True
+            skipped = self.status["loudness"] == "skipped"
+        if skipped:
+            threading.Thread(target=self._loudness, name="prefetch-loudness", daemon=True).start()
+
+    def cancel(self):
+        """
+        Stop the remaining work. A file this prefetch uploaded and nobody else has used is deleted
+        from Gemini; anything shared with other sessions is left to the registry's idle reaper.
+        """
+        if self._cancel.is_set():
+            return
+        self._cancel.set()
+        if self._finished["gemini"].is_set():
+            threading.Thread(target=self.registry.forget, args=(self.content_hash, self), daemon=True).start()
+
+    def wait(self, task, timeout=None):
+        """Block until a task has finished (in any state); returns False on timeout"""
+        return self._finished[task].wait(timeout)
+
+    def done(self):
+        return all(event.is_set() for event in self._finished.values())
+
+    def progress(self):
+        return sum(event.is_set() for event in self._finished.values()) / len(TASKS)
+
+    def stage_timings(self):
+        """Stage durations recorded so far, prefixed so they don't mix with the foreground job's"""
+        return {f"prefetch_{name}": seconds for name, seconds in self.job.stages.items()}
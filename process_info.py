@@ -0,0 +1,34 @@
+"""
+Process identity for state shared between worker processes.
+
+A PID alone isn't enough to tell whether the process that wrote a shared
+file is still around: a restarted container's gunicorn workers get the
+same PIDs again. Shared files record the PID together with the process
+start time.
+"""
+
+import os
+
+
+def start_time(pid=None):
+    """Start time of a process in clock ticks since boot (Linux /proc), or None where that isn't available"""
+    try:
+        with open(f"/proc/{pid or os.getpid()}/stat") as f:
+            # starttime is the 22nd field, after the parenthesised command name
+            return int(f.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def is_running(pid, started=None):
+    """Whether `pid` is alive and, given its recorded start time, still the same process"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    if started is None:
+        return True
+    current = start_time(pid)
+    return current is None or current == started
@@ -0,0 +1,307 @@
+"""
+Single-decode multi-rendition output ladder.
+
+Instead of rendering the edited video and then re-decoding it once per extra
+size, the edit's filters run once and ffmpeg's `split`/`asplit` feed one
+encoder per rung of the ladder in the same process. Rungs can be written as
+MP4 files or as HLS playlists with a master playlist.
+
+The same graph builder re-renders a plain edit with an encoding profile
+(build_render_command), so profile filters and loudness normalization are
+applied in the one pass too.
+"""
+
+import json
+import os
+import re
+import shlex
+
+from encoding_profiles import strip_filters
+from loudness import REPLACED_FILTERS, loudnorm_filter
+from video_join import JoinError, probe_clip
+
+DEFAULT_LADDER = [
+    {"name": "master", "height": None, "crf": 18, "maxrate": "8M", "audio_bitrate": "192k"},
+    {"name": "web", "height": 720, "video_bitrate": "2500k", "audio_bitrate": "128k"},
+    {"name": "mobile", "height": 480, "video_bitrate": "1000k", "audio_bitrate": "96k"},
+]
+
+HLS_SEGMENT_SECONDS = 6
+
+# Options that change which part of the input is read; kept ahead of -i
+_TRIM_OPTIONS = ("-ss", "-t", "-to")
+_VIDEO_FILTER_OPTIONS = ("-vf", "-filter:v")
+_AUDIO_FILTER_OPTIONS = ("-af", "-filter:a")
+_COMPLEX_FILTER_OPTIONS = ("-filter_complex", "-lavfi")
+_INPUT_AUDIO_MAP = re.compile(r"(0:a(?::0)?)\??")
+
+
+class LadderError(Exception):
+    """Raised when an edit command can't be turned into a single-pass ladder"""
+
+
+def load_ladder(path=None):
+    """Ladder from a JSON file (RENDITION_LADDER env var), or the default"""
+    path = path or os.getenv("RENDITION_LADDER")
+    if not path:
+        return DEFAULT_LADDER
+    with open(path) as f:
+        ladder = json.load(f)
+    if not ladder or not all("name" in rung for rung in ladder):
+        raise LadderError(f"{path} must be a non-empty list of rungs with a 'name'")
+    return ladder
+
+
+def _parse_bitrate(value):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmM]?)", str(value))
+    if not match:
+        return 0
+    number, unit = float(match.group(1)), match.group(2).lower()
+    return int(number * {"": 1, "k": 1000, "m": 1000000}[unit])
+
+
+def _is_audio_label(label):
+    name = label.strip("[]").lower()
+    return name.startswith("a") or name.endswith("a") or "aud" in name
+
+
+def parse_edit_command(command):
+    """
+    Pull the parts of a single-input edit command that the ladder needs:
+    trim options, the video/audio filters and, for -filter_complex edits, the mapped output labels.
+    """
+    try:
+        tokens = shlex.split(command.strip())
+    except ValueError as e:
+        raise LadderError(f"Can't parse command: {e}")
+    if not tokens or not tokens[0].lower().startswith("ffmpeg"):
+        raise LadderError("Command must start with 'ffmpeg'")
+
+    edit = {"trim": [], "video_filter": None, "audio_filter": None, "filter_complex": None, "maps": [],
+            "no_audio": "-an" in tokens, "audio_from_input": False}
+    inputs = 0
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        value = tokens[i + 1] if i + 1 < len(tokens) else None
+        if token == "-i":
+            inputs += 1
+        elif token in _TRIM_OPTIONS:
+            edit["trim"] += [token, value]
+        elif token in _VIDEO_FILTER_OPTIONS:
+            edit["video_filter"] = value
+        elif token in _AUDIO_FILTER_OPTIONS:
+            edit["audio_filter"] = value
+        elif token in _COMPLEX_FILTER_OPTIONS:
+            edit["filter_complex"] = value
+        elif token == "-map":
+            edit["maps"].append(value)
+        elif token.startswith("-") and value is not None and not value.startswith("-"):
+            # Some other option with a value (codec, preset...): the ladder sets its own
+            pass
+        else:
+            i += 1
+            continue
+        i += 2
+
+    if inputs != 1:
+        raise LadderError("Only single-input edits can be rendered as a ladder")
+
+    if edit["filter_complex"]:
+        labels = [m for m in edit["maps"] if m.startswith("[")]
+        if not labels:
+            raise LadderError("-filter_complex edits need -map [label] outputs")
+        edit["video_label"] = next((l for l in labels if not _is_audio_label(l)), None)
+        edit["audio_label"] = next((l for l in labels if _is_audio_label(l) and l != edit["video_label"]), None)
+        if edit["video_label"] is None:
+            raise LadderError("Couldn't find the video output of the filter graph")
+        # Input streams mapped next to the graph outputs (-map 0:a): the audio goes through the graph
+        # as [0:a] so the split and loudnorm still apply; anything else would be silently dropped
+        for stream in (m for m in edit["maps"] if not m.startswith("[")):
+            match = _INPUT_AUDIO_MAP.fullmatch(stream)
+            if not match or edit["audio_label"]:
+                raise LadderError(f"Can't carry -map {stream} into the ladder's filter graph")
+            edit["audio_label"] = f"[{match.group(1)}]"
+            edit["audio_from_input"] = True
+    return edit
+
+
+def _encoder_args(rung, profile):
+    """libx264/AAC settings for one output; the rung's own preset/crf win over the profile's"""
+    args = ["-c:v", "libx264", "-preset", rung.get("preset") or profile.get("preset", "medium")]
+    if profile.get("tune"):
+        args += ["-tune", profile["tune"]]
+    args += ["-pix_fmt", "yuv420p"]
+    if rung.get("crf") is not None:
+        args += ["-crf", str(rung["crf"])]
+    if rung.get("video_bitrate"):
+        args += ["-b:v", rung["video_bitrate"]]
+    maxrate = rung.get("maxrate") or rung.get("video_bitrate")
+    if maxrate:
+        args += ["-maxrate", maxrate, "-bufsize", f"{2 * _parse_bitrate(maxrate)}"]
+    if profile.get("vfr"):
+        # Keep the timestamps of the frames left after duplicate dropping
+        args += ["-fps_mode", "vfr"]
+    return args
+
+
+def _output_args(rung, video_label, audio_label, output_dir, base_name, hls, profile):
+    args = ["-map", video_label]
+    if audio_label:
+        args += ["-map", audio_label]
+
+    args += _encoder_args(rung, profile)
+    if audio_label:
+        args += ["-c:a", "aac", "-b:a", rung.get("audio_bitrate", "128k")]
+
+    name = f"{base_name}_{rung['name']}"
+    if hls:
+        # Keyframes on segment boundaries so every rung switches cleanly
+        args += ["-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+                 "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS), "-hls_playlist_type", "vod",
+                 "-hls_segment_filename", os.path.join(output_dir, f"{name}_%04d.ts"),
+                 os.path.join(output_dir, f"{name}.m3u8")]
+    else:
+        args += ["-movflags", "+faststart", os.path.join(output_dir, f"{name}.mp4")]
+    return args
+
+
+def has_audio_stream(path):
+    try:
+        return probe_clip(path)["signature"]["audio_codec"] is not None
+    except JoinError:
+        return True
+
+
+def _edit_graph(edit, input_path, has_audio, profile, loudness=None):
+    """
+    Filter graph for the edit plus the profile's extra filters and, given measured
+    loudness stats, the linear loudnorm pass.
+    Returns (graph list, video output label, audio output label or None).
+    """
+    if has_audio is None and not edit["filter_complex"] and not edit["no_audio"]:
+        has_audio = has_audio_stream(input_path)
+    removed = profile.get("strip_filters")
+    extra_video = ",".join(profile.get("video_filters", []))
+    normalize = loudnorm_filter(loudness)
+
+    graph = []
+    if edit["filter_complex"]:
+        filter_complex = strip_filters(edit["filter_complex"], removed)
+        if normalize:
+            filter_complex = strip_filters(filter_complex, REPLACED_FILTERS, "anull")
+        graph.append(filter_complex)
+        video_source = edit["video_label"]
+        audio_source = edit["audio_label"]
+        if edit["audio_from_input"]:
+            if has_audio is None:
+                has_audio = has_audio_stream(input_path)
+            if not has_audio:
+                # -map 0:a? on a silent input
+                audio_source = None
+        if extra_video:
+            graph.append(f"{video_source}{extra_video}[edited_v]")
+            video_source = "[edited_v]"
+        if audio_source and (normalize or edit["audio_from_input"]):
+            # An input stream can't be mapped by its [0:a] label, so it always gets a graph output
+            graph.append(f"{audio_source}{normalize or 'anull'}[edited_a]")
+            audio_source = "[edited_a]"
+    else:
+        video_filter = ",".join(f for f in (strip_filters(edit["video_filter"], removed), extra_video) if f)
+        graph.append(f"[0:v]{video_filter or 'null'}[edited_v]")
+        video_source = "[edited_v]"
+        audio_source = None
+        if has_audio and not edit["no_audio"]:
+            audio_filter = edit["audio_filter"]
+            if normalize:
+                audio_filter = ",".join(f for f in (strip_filters(audio_filter, REPLACED_FILTERS, "anull"),
+                                                    normalize) if f)
+            graph.append(f"[0:a]{audio_filter or 'anull'}[edited_a]")
+            audio_source = "[edited_a]"
+    return graph, video_source, audio_source
+
+
+def build_ladder_command(command, input_path, output_dir, ladder=None, hls=False, has_audio=None, profile=None,
+                         loudness=None):
+    """
+    Turn an edit command into one FFmpeg command that writes every rung of the ladder.
+    loudness is a loudness.measure_loudness() result; every rung shares the one normalized audio chain.
+    Returns (command string, list of output paths).
+    """
+    ladder = ladder or load_ladder()
+    profile = profile or {}
+    edit = parse_edit_command(command)
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    count = len(ladder)
+
+    graph, video_source, audio_source = _edit_graph(edit, input_path, has_audio, profile, loudness)
+
+    # Decode and filter once, then fan out to one encoder per rung.
+    # Labels are prefixed so they can't collide with the ones in the AI's filter graph.
+    split_labels = [f"[ladder_v{i}]" for i in range(count)]
+    graph.append(f"{video_source}split={count}{''.join(split_labels)}")
+    audio_labels = [None] * count
+    if audio_source:
+        audio_labels = [f"[ladder_a{i}]" for i in range(count)]
+        graph.append(f"{audio_source}asplit={count}{''.join(audio_labels)}")
+
+    video_labels = []
+    for i, rung in enumerate(ladder):
+        if rung.get("height"):
+            # Never upscale: a source shorter than the rung keeps its own height
+            graph.append(f"{split_labels[i]}scale=-2:'min(ih,{rung['height']})'[ladder_v{i}_scaled]")
+            video_labels.append(f"[ladder_v{i}_scaled]")
+        else:
+            video_labels.append(split_labels[i])
+
+    args = ["ffmpeg", "-y"] + edit["trim"] + ["-i", input_path, "-filter_complex", ";".join(graph)]
+    outputs = []
+    for i, rung in enumerate(ladder):
+        rung_args = _output_args(rung, video_labels[i], audio_labels[i], output_dir, base_name, hls, profile)
+        outputs.append(rung_args[-1])
+        args += rung_args
+
+    return shlex.join(args), outputs
+
+
+def build_render_command(command, input_path, output_path, profile, has_audio=None, loudness=None):
+    """
+    Re-express a single-input edit command as one output encoded with an encoding profile
+    (see encoding_profiles): the profile's filters are added and its encoder settings used.
+    With loudness stats, the audio is normalized in the same pass.
+    """
+    edit = parse_edit_command(command)
+    graph, video_source, audio_source = _edit_graph(edit, input_path, has_audio, profile, loudness)
+
+    args = ["ffmpeg", "-y"] + edit["trim"] + ["-i", input_path, "-filter_complex", ";".join(graph),
+                                              "-map", video_source]
+    if audio_source:
+        args += ["-map", audio_source]
+    args += _encoder_args({"crf": profile.get("crf", 23)}, profile)
+    if audio_source:
+        args += ["-c:a", "aac", "-b:a", "192k"]
+    args += ["-movflags", "+faststart", output_path]
+    return shlex.join(args)
+
+
+def master_playlist(ladder, output_paths):
+    """Text of the HLS master playlist pointing at every rung (playlists referenced by file name)"""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for rung, path in zip(ladder, output_paths):
+        video_bitrate = _parse_bitrate(rung.get("maxrate") or rung.get("video_bitrate") or 0)
+        bandwidth = video_bitrate + _parse_bitrate(rung.get("audio_bitrate", "128k"))
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},NAME=\"{rung['name']}\"")
+        lines.append(os.path.basename(path))
+    return "\n".join(lines) + "\n"
+
+
+def master_playlist_path(output_dir, base_name):
+    return os.path.join(output_dir, f"{base_name}_master.m3u8")
+
+
+def write_master_playlist(ladder, output_paths, output_dir, base_name):
+    """Write the HLS master playlist next to the rung playlists; returns its path"""
+    master_path = master_playlist_path(output_dir, base_name)
+    with open(master_path, "w") as f:
+        f.write(master_playlist(ladder, output_paths))
+    return master_path
@@ -0,0 +1,289 @@
+"""
+Thumbnail sprite and waveform timeline for reviewing cut points.
+
+One FFmpeg pass writes a sprite sheet of thumbnails taken at fixed intervals
+and a low-rate mono PCM track, which is reduced to a small array of audio
+peaks. Both are cached per content hash, so the UI can overlay the AI's
+proposed cuts without sending the video to the browser.
+"""
+
+import json
+import math
+import os
+import re
+import shlex
+import tempfile
+
+from content_hash import file_sha256
+from ffmpeg_runner import run_ffmpeg
+from video_join import probe_clip
+
+CACHE_DIR = os.getenv("TIMELINE_CACHE_DIR", os.path.join("cache", "timelines"))
+THUMB_WIDTH = 160
+SPRITE_COLUMNS = 10
+MAX_THUMBNAILS = 200
+NUM_PEAKS = 1000
+PCM_SAMPLE_RATE = 2000
+
+_NUMBER = r"\d+(?:\.\d+)?"
+# FFmpeg durations: seconds, MM:SS or HH:MM:SS, each with optional fractional seconds
+_TIME = rf"(?:\d+:){{0,2}}{_NUMBER}"
+
+
+class TimelineError(Exception):
+    """Raised when the sprite/waveform pass fails"""
+
+
+def _cache_paths(content_hash, interval):
+    directory = os.path.join(CACHE_DIR, content_hash, f"every_{interval:g}s")
+    return {
+        "dir": directory,
+        "sprite": os.path.join(directory, "sprite.jpg"),
+        "peaks": os.path.join(directory, "peaks.npy"),
+        "meta": os.path.join(directory, "timeline.json"),
+    }
+
+
+def _compute_peaks(pcm_path, num_peaks):
+    import numpy as np
+
+    samples = np.fromfile(pcm_path, dtype="<i2")
+    if samples.size == 0:
+        return np.zeros(num_peaks, dtype=np.float32)
+    samples = np.abs(samples.astype(np.int32))
+    bucket = max(1, math.ceil(samples.size / num_peaks))
+    padded = np.zeros(bucket * num_peaks, dtype=np.int32)
+    padded[:samples.size] = samples[:bucket * num_peaks]
+    peaks = padded.reshape(num_peaks, bucket).max(axis=1).astype(np.float32) / 32768.0
+    return peaks
+
+
+def build_timeline(video_path, interval=2.0, app="timeline", cancel_event=None):
+    """
+    Return timeline data for a video, generating and caching it on first use:
+    {"sprite": path, "peaks": path, "interval", "columns", "rows", "count", "thumb_width",
+     "thumb_height", "duration", "content_hash"}
+    """
+    content_hash = file_sha256(video_path)
+    probe = probe_clip(video_path)
+    duration = probe["duration"]
+    # Widen the interval for long videos so the sprite stays a reasonable size
+    if duration and duration / interval > MAX_THUMBNAILS:
+        interval = math.ceil(duration / MAX_THUMBNAILS)
+
+    paths = _cache_paths(content_hash, interval)
+    if os.path.exists(paths["meta"]):
+        with open(paths["meta"]) as f:
+            return json.load(f)
+
+    os.makedirs(paths["dir"], exist_ok=True)
+    signature = probe["signature"]
+    count = max(1, math.ceil(duration / interval)) if duration else 1
+    rows = math.ceil(count / SPRITE_COLUMNS)
+    thumb_height = 2 * round(THUMB_WIDTH * signature["height"] / signature["width"] / 2) if signature["width"] else 90
+    has_audio = signature["audio_codec"] is not None
+
+    with tempfile.TemporaryDirectory(dir=paths["dir"]) as tmp_dir:
+        pcm_path = os.path.join(tmp_dir, "audio.pcm")
+        sprite_tmp = os.path.join(tmp_dir, "sprite.jpg")
+        args = [
+            "ffmpeg", "-y", "-i", video_path,
+            "-map", "0:v:0",
+            "-vf", f"fps=1/{interval:g},scale={THUMB_WIDTH}:{thumb_height},tile={SPRITE_COLUMNS}x{rows}",
+            "-frames:v", "1", "-q:v", "4", sprite_tmp,
+        ]
+        if has_audio:
+            args += ["-map", "0:a:0", "-ac", "1", "-ar", str(PCM_SAMPLE_RATE), "-f", "s16le", pcm_path]
+
+        result = run_ffmpeg(shlex.join(args), app, output_path=sprite_tmp, priority="preview",
+                            cancel_event=cancel_event)
+        if result.returncode != 0:
+            raise TimelineError(f"Timeline pass failed: {result.stderr[-500:]}")
+
+        import numpy as np
+
+        if has_audio:
+            peaks = _compute_peaks(pcm_path, NUM_PEAKS)
+        else:
+            peaks = np.zeros(NUM_PEAKS, dtype=np.float32)
+        np.save(paths["peaks"], peaks)
+        os.replace(sprite_tmp, paths["sprite"])
+
+    timeline = {
+        "sprite": paths["sprite"],
+        "peaks": paths["peaks"],
+        "interval": interval,
+        "columns": SPRITE_COLUMNS,
+        "rows": rows,
+        "count": count,
+        "thumb_width": THUMB_WIDTH,
+        "thumb_height": thumb_height,
+        "duration": duration,
+        "content_hash": content_hash,
+    }
+    # Written last: its presence marks a complete cache entry
+    with open(paths["meta"], "w") as f:
+        json.dump(timeline, f)
+    return timeline
+
+
+def load_peaks(timeline):
+    import numpy as np
+
+    return np.load(timeline["peaks"])
+
+
+def _seconds(value):
+    """Seconds in an FFmpeg duration ("12.5", "01:30", "00:01:30.5"); raises ValueError otherwise"""
+    if not re.fullmatch(_TIME, value.strip()):
+        raise ValueError(f"Not a duration: {value}")
+    seconds = 0.0
+    for part in value.strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def _parse_trim_args(params):
+    """start/end of a trim=... filter (positional or named; seconds or escaped HH\\:MM\\:SS)"""
+    start, end, length = 0.0, None, None
+    positional = []
+    # Colons inside a time value are escaped (\:) since a bare colon separates filter options
+    for part in re.split(r"(?<!\\):", params):
+        part = part.replace("\\:", ":")
+        if "=" in part:
+            key, value = part.split("=", 1)
+            try:
+                value = _seconds(value)
+            except ValueError:
+                continue
+            if key == "start":
+                start = value
+            elif key == "end":
+                end = value
+            elif key == "duration":
+                length = value
+        else:
+            positional.append(part)
+    try:
+        if positional:
+            start = _seconds(positional[0])
+        if len(positional) > 1:
+            end = _seconds(positional[1])
+    except ValueError:
+        return None
+    if end is None and length is not None:
+        end = start + length
+    return start, end
+
+
+def _not_spans(expression):
+    """(start, end) character spans of every not(...) group in a filter expression"""
+    spans = []
+    for match in re.finditer(r"(?<![a-z_])not\(", expression):
+        depth = 0
+        for index in range(match.end() - 1, len(expression)):
+            if expression[index] == "(":
+                depth += 1
+            elif expression[index] == ")":
+                depth -= 1
+                if depth == 0:
+                    spans.append((match.start(), index))
+                    break
+    return spans
+
+
+def _subtract(segments, removed):
+    """segments with the removed ranges taken out"""
+    for cut_start, cut_end in removed:
+        remaining = []
+        for start, end in segments:
+            if cut_end <= start or cut_start >= end:
+                remaining.append((start, end))
+                continue
+            if cut_start > start:
+                remaining.append((start, cut_start))
+            if cut_end < end:
+                remaining.append((cut_end, end))
+        segments = remaining
+    return segments
+
+
+def kept_segments(command, duration):
+    """
+    Best-effort list of (start, end) seconds an FFmpeg edit command keeps.
+    Understands trim filters, select='between(t,a,b)+...' (and not(between(...)) cuts) and -ss/-t/-to.
+    """
+    command = command or ""
+    segments = []
+    for match in re.finditer(r"(?<![a-z])trim=([^,;\[\]'\"]+)", command):
+        parsed = _parse_trim_args(match.group(1))
+        if parsed:
+            segments.append((parsed[0], parsed[1] if parsed[1] is not None else duration))
+
+    if not segments and "select=" in command:
+        # between() inside not(...) marks a range the edit removes rather than keeps
+        negated = _not_spans(command)
+        kept, removed = [], []
+        for match in re.finditer(rf"between\(t,\s*({_NUMBER}),\s*({_NUMBER})\)", command):
+            inside_not = any(start < match.start() < end for start, end in negated)
+            (removed if inside_not else kept).append((float(match.group(1)), float(match.group(2))))
+        if removed:
+            segments = _subtract(kept or [(0.0, duration)], removed)
+        else:
+            segments = kept
+
+    if not segments:
+        start = re.search(rf"-ss\s+['\"]?({_TIME})", command)
+        length = re.search(rf"-t\s+['\"]?({_TIME})", command)
+        end = re.search(rf"-to\s+['\"]?({_TIME})", command)
+        if start or length or end:
+            begin = _seconds(start.group(1)) if start else 0.0
+            if length:
+                finish = begin + _seconds(length.group(1))
+            elif end:
+                finish = _seconds(end.group(1))
+            else:
+                finish = duration
+            segments.append((begin, finish))
+
+    # select and aselect usually repeat the same ranges: merge overlaps so durations add up
+    merged = []
+    for start, end in sorted((max(0.0, s), min(duration, e)) for s, e in segments):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    # Nothing understood (or nothing inside the video): assume the whole video is kept
+    return merged or [(0.0, duration)]
+
+
+def cut_segments(command, duration):
+    """Complement of kept_segments: the ranges the edit removes"""
+    cuts = []
+    cursor = 0.0
+    for start, end in kept_segments(command, duration):
+        if start > cursor:
+            cuts.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < duration:
+        cuts.append((cursor, duration))
+    return cuts
+
+
+def render_sprite_with_cuts(timeline, cuts):
+    """Copy of the sprite sheet with thumbnails inside cut ranges tinted red (PIL image)"""
+    from PIL import Image, ImageDraw
+
+    sprite = Image.open(timeline["sprite"]).convert("RGBA")
+    overlay = Image.new("RGBA", sprite.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    for index in range(timeline["count"]):
+        moment = index * timeline["interval"]
+        if any(start <= moment < end for start, end in cuts):
+            x = (index % timeline["columns"]) * timeline["thumb_width"]
+            y = (index // timeline["columns"]) * timeline["thumb_height"]
+            draw.rectangle([x, y, x + timeline["thumb_width"] - 1, y + timeline["thumb_height"] - 1],
+                           fill=(220, 30, 30, 110), outline=(220, 30, 30, 255), width=3)
+    return Image.alpha_composite(sprite, overlay).convert("RGB")
@@ -1,15 +1,28 @@
 import streamlit as st
 import os
-import time
 import subprocess
 import json
 from pathlib import Path
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+import gemini_client
+from content_hash import hashing_copy
+from encoder_tuning import TARGET_REALTIME, apply_settings, choose_settings, describe, settings_for_job
+from encoding_profiles import PROFILE_CHOICES, resolve_profile
+from ffmpeg_runner import run_ffmpeg
+from gemini_files import GeminiFileError, get_registry
+from job_ledger import JobRecord, get_ledger
+from loudness import LoudnessError, measure_loudness
+from prefetch import Prefetch
+from metrics import BYTES_PROCESSED, INPUT_SIZE, JOBS_IN_PROGRESS, JOBS_TOTAL, start_http_server
+from renditions import LadderError, build_ladder_command, build_render_command, load_ladder, write_master_playlist
+from review_timeline import build_timeline, cut_segments, load_peaks, render_sprite_with_cuts
+
 # Load environment variables
 load_dotenv()
 
+METRICS_APP = "streamlit"
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="AI Video Editor",
@@ -18,13 +31,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize Gemini client
+# Gemini client is created on first analysis so the page renders without importing the SDK
 @st.cache_resource
 def initialize_gemini():
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-    return genai.GenerativeModel('gemini-2.5-flash')
-
-gemini_model = initialize_gemini()
+    return gemini_client.get_model('gemini-2.5-flash')
 
 # Create directories for file management
 @st.cache_resource
@@ -40,6 +50,55 @@ def setup_directories():
 
 directories = setup_directories()
 
+# Expose Prometheus metrics on a side port (Streamlit has no route for /metrics)
+@st.cache_resource
+def start_metrics_server():
+    port = int(os.getenv("METRICS_PORT", "9464"))
+    try:
+        return start_http_server(port)
+    except OSError:
+        # Port already taken (e.g. another Streamlit process); skip exporting
+        return None
+
+start_metrics_server()
+
+# Waveform with the AI's proposed cuts shaded
+def waveform_chart(peaks, duration, cuts):
+    import altair as alt
+    import pandas as pd
+
+    step = duration / len(peaks) if len(peaks) else 0
+    waveform = pd.DataFrame({"time": [i * step for i in range(len(peaks))], "peak": peaks})
+    chart = alt.Chart(waveform).mark_area(color="#4c78a8").encode(
+        x=alt.X("time:Q", title="Time (s)", scale=alt.Scale(domain=[0, duration])),
+        y=alt.Y("peak:Q", title="Audio peak", scale=alt.Scale(domain=[0, 1]))
+    )
+    if cuts:
+        cut_ranges = pd.DataFrame(cuts, columns=["start", "end"])
+        shading = alt.Chart(cut_ranges).mark_rect(color="red", opacity=0.3).encode(x="start:Q", x2="end:Q")
+        chart = shading + chart
+    return chart.properties(height=120)
+
+# Progress of the background upload/pre-analysis started when a file is selected
+PREFETCH_LABELS = {
+    "gemini": "Upload to AI",
+    "profile": "Encoding profile detection",
+    "timeline": "Cut review timeline",
+    "loudness": "Loudness measurement",
+}
+PREFETCH_ICONS = {"pending": "⏸️", "running": "⏳", "done": "✅", "failed": "⚠️", "cancelled": "✖️", "skipped": "➖"}
+
+def show_prefetch_status(prefetch):
+    st.caption("**Preparing in the background**")
+    for task, label in PREFETCH_LABELS.items():
+        state = prefetch.status[task]
+        note = f" ({prefetch.errors[task]})" if task in prefetch.errors else ""
+        st.caption(f"{PREFETCH_ICONS[state]} {label}: {state}{note}")
+
+# Refresh the status on its own while work is in flight (needs st.fragment, Streamlit >= 1.37)
+if hasattr(st, "fragment"):
+    show_prefetch_status = st.fragment(run_every=2)(show_prefetch_status)
+
 # Title and description
 st.title("🎬 AI Video Editor")
 st.markdown("Upload a video and let AI analyze it to remove stutters, pauses, and improve the overall quality using FFmpeg.")
@@ -54,6 +113,49 @@ analysis_options = st.sidebar.multiselect(
     default=["Stutters or repeated words", "Long pauses", "Loading screens"]
 )
 
+st.sidebar.markdown("### Output Options")
+PROFILE_LABELS = {
+    "auto": "Auto-detect",
+    "standard": "Standard (camera footage)",
+    "screen": "Screen recording (drop duplicate frames)",
+}
+encoding_choice = st.sidebar.selectbox(
+    "Encoding profile",
+    PROFILE_CHOICES,
+    format_func=PROFILE_LABELS.get,
+    help="Auto-detect picks the screen-recording profile for browser/screen captures"
+)
+st.sidebar.markdown("### Encoder Targets")
+target_realtime = st.sidebar.number_input(
+    "Minimum encoding speed (× realtime)",
+    min_value=0.0,
+    value=TARGET_REALTIME,
+    step=0.5,
+    help="Pick the best-quality settings from this machine's calibration that encode at least this fast (0 = no limit)"
+)
+max_size_mb = st.sidebar.number_input(
+    "Maximum output size (MB, 0 = no limit)",
+    min_value=0.0,
+    value=0.0,
+    step=10.0
+)
+normalize_audio = st.sidebar.checkbox(
+    "Normalize loudness (EBU R128)",
+    value=False,
+    help="Measure the video's loudness once (cached) and normalize it to -16 LUFS in the same render pass"
+)
+create_renditions = st.sidebar.checkbox(
+    "Also create web/mobile renditions",
+    value=False,
+    help="Decode and filter the edit once and encode every size of the rendition ladder in the same FFmpeg run"
+)
+hls_output = st.sidebar.checkbox(
+    "Write renditions as HLS",
+    value=False,
+    disabled=not create_renditions,
+    help="Segmented HLS playlists plus a master playlist instead of MP4 files"
+)
+
 # Main interface
 col1, col2 = st.columns([1, 1])
 
@@ -67,11 +169,34 @@ with col1:
     )
     
     if uploaded_file is not None:
-        # Save uploaded file to input directory
+        # Save uploaded file to input directory (once per selected file, not on every rerun)
         video_filename = f"temp_{uploaded_file.name}"
         video_path = os.path.join(directories['input'], video_filename)
-        with open(video_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        upload_key = (getattr(uploaded_file, "file_id", None), uploaded_file.name, uploaded_file.size)
+        saved = st.session_state.get("saved_upload")
+        if saved is None or saved["key"] != upload_key or not os.path.exists(video_path):
+            # Another file was chosen: stop the background work for the previous one first
+            if st.session_state.get("prefetch") is not None:
+                st.session_state.prefetch.cancel()
+                st.session_state.prefetch = None
+            save_job = JobRecord(METRICS_APP, uploaded_file.name)
+            with save_job.stage("save_upload"):
+                uploaded_file.seek(0)
+                video_size, video_hash = hashing_copy(uploaded_file, video_path)
+            BYTES_PROCESSED.inc(video_size, app=METRICS_APP, stage="save_upload")
+            saved = {"key": upload_key, "size": video_size, "hash": video_hash, "stages": save_job.stages}
+            st.session_state.saved_upload = saved
+        video_size, video_hash = saved["size"], saved["hash"]
+        
+        # Upload to Gemini and pre-analyse locally in the background right away
+        if st.session_state.get("prefetch") is None:
+            st.session_state.prefetch = Prefetch(
+                video_hash, video_path, uploaded_file.name, METRICS_APP, get_registry(METRICS_APP),
+                loudness=normalize_audio
+            ).start()
+        elif normalize_audio:
+            # Switched on after the file was selected
+            st.session_state.prefetch.request_loudness()
         
         st.success(f"✅ Video uploaded: {uploaded_file.name}")
         st.success(f"📁 Saved to: {video_path}")
@@ -82,6 +207,12 @@ with col1:
         file_size = os.path.getsize(video_path) / (1024 * 1024)  # MB
         st.write(f"**File size:** {file_size:.2f} MB")
         st.write(f"**File name:** {uploaded_file.name}")
+        show_prefetch_status(st.session_state.prefetch)
+    elif st.session_state.get("prefetch") is not None:
+        # File removed: nothing to prepare any more
+        st.session_state.prefetch.cancel()
+        st.session_state.prefetch = None
+        st.session_state.saved_upload = None
 
 with col2:
     st.header("🤖 AI Analysis & Editing")
@@ -93,73 +224,90 @@ with col2:
             status_container = st.container()
             progress_bar = st.progress(0)
             
-            with status_container:
+            with status_container, JOBS_IN_PROGRESS.track_inprogress(app=METRICS_APP):
                 st.info("🚀 Starting video analysis...")
                 progress_bar.progress(10)
+                INPUT_SIZE.observe(os.path.getsize(video_path), app=METRICS_APP)
+                job = JobRecord(METRICS_APP, uploaded_file.name)
+                job.set_input(video_hash, video_size)
+                job.stages.update(st.session_state.saved_upload["stages"])
+                prefetch = st.session_state.prefetch
                 
                 try:
-                    # Upload video to Gemini
-                    st.info("📤 Uploading video to AI...")
-                    video_file_obj = genai.upload_file(path=video_path)
-                    progress_bar.progress(30)
+                    gemini_model = initialize_gemini()
+                    gemini_files = get_registry(METRICS_APP)
+                    
+                    # Create prompt based on selected options
+                    issues_text = ", ".join([f"- {option}" for option in analysis_options])
+                    
+                    # Normalize the path for Windows
+                    normalized_video_path = os.path.abspath(video_path).replace('\\', '/')
+                    
+                    prompt = f"""
+                    Analyze this video and provide only a valid PowerShell FFmpeg command without any non real filters to improve it or remove any lags or loading times.
+                    
+                    The input video file name is: {uploaded_file.name}
+                    The input file path will be: {video_path}
+                    Use the full path in your command for the input file.
+                    
+                    Look for these specific issues:
+                    {issues_text}
+                    
+                    Return ONLY the valid FFmpeg command, nothing else. No JSON, no explanations, just the command.
+                    Remember to use the actual input file path in your command.
                     
-                    # Wait for processing
-                    st.info("⏳ AI is processing video...")
-                    while video_file_obj.state.name == "PROCESSING":
-                        time.sleep(5)
-                        video_file_obj = genai.get_file(video_file_obj.name)
+                    """
                     
-                    if video_file_obj.state.name == "FAILED":
-                        st.error("❌ Failed to process video")
+                    # Re-analysing the same video (e.g. with other options) reuses the uploaded file
+                    if gemini_files.has(video_hash):
+                        st.info("♻️ Reusing video already uploaded to AI...")
+                    elif prefetch.status["gemini"] == "running":
+                        st.info("⏳ Finishing the background upload to AI...")
                     else:
+                        st.info("📤 Uploading video to AI and waiting for processing...")
+                    progress_bar.progress(30)
+                    
+                    with gemini_files.use(video_hash, video_path, job) as video_file_obj:
                         progress_bar.progress(60)
-                        
-                        # Create prompt based on selected options
-                        issues_text = ", ".join([f"- {option}" for option in analysis_options])
-                        
-                        # Normalize the path for Windows
-                        normalized_video_path = os.path.abspath(video_path).replace('\\', '/')
-                        
-                        prompt = f"""
-                        Analyze this video and provide only a valid PowerShell FFmpeg command without any non real filters to improve it or remove any lags or loading times.
-                        
-                        The input video file name is: {uploaded_file.name}
-                        The input file path will be: {video_path}
-                        Use the full path in your command for the input file.
-                        
-                        Look for these specific issues:
-                        {issues_text}
-                        
-                        Return ONLY the valid FFmpeg command, nothing else. No JSON, no explanations, just the command.
-                        Remember to use the actual input file path in your command.
-                        
-                        """
-                        
                         st.info("🧠 AI is analyzing video content...")
-                        response = gemini_model.generate_content([video_file_obj, prompt])
+                        with job.stage("generate_content"):
+                            response = gemini_model.generate_content([video_file_obj, prompt])
+                    
+                    # Clean up command
+                    with job.stage("command_cleanup"):
                         ffmpeg_command = response.text.strip()
-                        
-                        # Clean up command
                         if ffmpeg_command.startswith('```'):
                             lines = ffmpeg_command.split('\n')
                             ffmpeg_command = '\n'.join([line for line in lines if not line.startswith('```')])
                             ffmpeg_command = ffmpeg_command.strip()
-                        
-                        progress_bar.progress(80)
-                        
-                        # Store results in session state
-                        st.session_state.ffmpeg_command = ffmpeg_command
-                        st.session_state.video_path = video_path
-                        st.session_state.original_filename = uploaded_file.name
-                        
-                        # Clean up uploaded file from Gemini
-                        genai.delete_file(video_file_obj.name)
-                        progress_bar.progress(100)
-                        
-                        st.success("✅ Video analysis complete!")
-                        
+                    
+                    progress_bar.progress(80)
+                    
+                    # Store results in session state
+                    st.session_state.ffmpeg_command = ffmpeg_command
+                    st.session_state.video_path = video_path
+                    st.session_state.original_filename = uploaded_file.name
+                    st.session_state.job_id = job.job_id
+                    st.session_state.video_hash = video_hash
+                    job.set_result(ffmpeg_command)
+                    progress_bar.progress(100)
+                    
+                    job.stages.update(prefetch.stage_timings())
+                    JOBS_TOTAL.inc(app=METRICS_APP, outcome="success")
+                    st.success("✅ Video analysis complete!")
+                    
+                except GeminiFileError:
+                    JOBS_TOTAL.inc(app=METRICS_APP, outcome="error")
+                    job.error = "Gemini processing failed"
+                    st.error("❌ Failed to process video")
+                    
                 except Exception as e:
+                    JOBS_TOTAL.inc(app=METRICS_APP, outcome="error")
+                    job.error = str(e)
                     st.error(f"❌ Error during analysis: {str(e)}")
+                
+                finally:
+                    get_ledger().append(job)
 
 # Display results if analysis is complete
 if hasattr(st.session_state, 'ffmpeg_command'):
@@ -194,7 +342,8 @@ if hasattr(st.session_state, 'ffmpeg_command'):
                 st.rerun()
             
             # Re-encode with compression
-            simple_reencode = f"ffmpeg -y -i {safe_input_path} -c:v libx264 -crf 23 -preset medium {safe_output_path}"
+            encoder = choose_settings(target_realtime or None)
+            simple_reencode = f"ffmpeg -y -i {safe_input_path} -c:v libx264 -crf {encoder['crf']} -preset {encoder['preset']} {safe_output_path}"
             st.code(simple_reencode, language="bash")
             if st.button("Use Re-encode", key="simple_reencode"):
                 st.session_state.ffmpeg_command = simple_reencode
@@ -223,6 +372,10 @@ if hasattr(st.session_state, 'ffmpeg_command'):
             execution_container = st.container()
             exec_progress = st.progress(0)
             
+            # Render record shares the analysis job id so both lines can be joined offline
+            render_job = JobRecord(METRICS_APP, st.session_state.original_filename, job_id=st.session_state.get('job_id'))
+            render_job.set_input(st.session_state.get('video_hash'), os.path.getsize(st.session_state.video_path) if os.path.exists(st.session_state.video_path) else None)
+            
             with execution_container:
                 try:
                     # Create output path in output directory
@@ -351,15 +504,77 @@ if hasattr(st.session_state, 'ffmpeg_command'):
                         for error in validation_errors:
                             st.error(f"❌ Validation Error: {error}")
                     
+                    encoding = None
+                    if command_valid:
+                        if encoding_choice == "auto" and st.session_state.get("prefetch") is not None:
+                            st.session_state.prefetch.wait("profile")
+                        profile_name, encoding = resolve_profile(
+                            encoding_choice,
+                            st.session_state.video_path,
+                            st.session_state.original_filename,
+                            METRICS_APP
+                        )
+                        st.info(f"🎛️ Encoding profile: {PROFILE_LABELS[profile_name]}")
+                        encoder = settings_for_job(
+                            st.session_state.video_path,
+                            final_command,
+                            target_realtime=target_realtime or None,
+                            max_size_mb=max_size_mb or None
+                        )
+                        # The screen profile keeps its own text-friendly tuning
+                        if profile_name == "standard":
+                            encoding = apply_settings(encoding, encoder)
+                            st.info(f"⚙️ Encoder: {describe(encoder)}")
+                    
+                    loudness = None
+                    if command_valid and normalize_audio:
+                        if st.session_state.get("prefetch") is not None:
+                            st.session_state.prefetch.wait("loudness")
+                        try:
+                            loudness = measure_loudness(st.session_state.video_path, METRICS_APP)
+                            if loudness:
+                                st.info(f"🔊 Normalizing from {loudness['input_i']:.1f} LUFS to {loudness['target']['I']:g} LUFS")
+                        except LoudnessError as e:
+                            st.warning(f"⚠️ Loudness measurement failed, audio left as-is: {e}")
+                    
+                    rendition_outputs = None
+                    if command_valid and create_renditions:
+                        try:
+                            final_command, rendition_outputs = build_ladder_command(
+                                final_command,
+                                st.session_state.video_path,
+                                directories['output'],
+                                hls=hls_output,
+                                profile=encoding,
+                                loudness=loudness
+                            )
+                            output_path = rendition_outputs[0]
+                            st.info(f"🎞️ Rendering {len(rendition_outputs)} renditions from a single decode:")
+                            st.code(final_command, language="bash")
+                        except LadderError as e:
+                            st.warning(f"⚠️ Can't render renditions in one pass ({e}); running the command as-is")
+                    elif command_valid and (profile_name != "standard" or loudness or encoder["source"] == "calibrated"):
+                        try:
+                            final_command = build_render_command(
+                                final_command,
+                                st.session_state.video_path,
+                                output_path,
+                                encoding,
+                                loudness=loudness
+                            )
+                            st.code(final_command, language="bash")
+                        except LadderError as e:
+                            st.warning(f"⚠️ Can't apply the encoding profile/normalization ({e}); running the command as-is")
+                    
                     if command_valid:
                         # Execute command with better error handling
-                        result = subprocess.run(
+                        result = run_ffmpeg(
                             final_command,
-                            shell=True,
-                            capture_output=True,
-                            text=True,
-                            cwd=os.getcwd(),
-                            timeout=300  # 5 minute timeout
+                            METRICS_APP,
+                            output_path=output_path,
+                            timeout=300,  # 5 minute timeout
+                            job=render_job,
+                            threads=encoder["threads"]
                         )
                         
                         exec_progress.progress(80)
@@ -375,8 +590,18 @@ if hasattr(st.session_state, 'ffmpeg_command'):
                             exec_progress.progress(100)
                             st.success("✅ Video processing completed successfully!")
                             
-                            # Display processed video
-                            if os.path.exists(output_path):
+                            # Display processed video (HLS renditions are playlists, not playable files)
+                            if rendition_outputs and hls_output:
+                                master_path = write_master_playlist(
+                                    load_ladder(),
+                                    rendition_outputs,
+                                    directories['output'],
+                                    Path(st.session_state.video_path).stem
+                                )
+                                st.success(f"📺 HLS master playlist: {master_path}")
+                                for rendition_path in rendition_outputs:
+                                    st.write(f"- `{rendition_path}`")
+                            elif os.path.exists(output_path):
                                 st.subheader("🎉 Processed Video")
                                 st.video(output_path)
                                 
@@ -402,21 +627,23 @@ if hasattr(st.session_state, 'ffmpeg_command'):
                                     st.metric("Processed Size", f"{processed_size:.2f} MB")
                                 with col7:
                                     st.metric("Size Reduction", f"{size_reduction:.1f}%")
+                                
+                                # Smaller renditions encoded in the same pass
+                                if rendition_outputs:
+                                    st.subheader("🎞️ Renditions")
+                                    for rendition_path in rendition_outputs[1:]:
+                                        if os.path.exists(rendition_path):
+                                            with open(rendition_path, "rb") as file:
+                                                st.download_button(
+                                                    label=f"📥 Download {os.path.basename(rendition_path)} ({os.path.getsize(rendition_path) / (1024 * 1024):.2f} MB)",
+                                                    data=file.read(),
+                                                    file_name=os.path.basename(rendition_path),
+                                                    mime="video/mp4",
+                                                    key=f"download_{rendition_path}"
+                                                )
                             else:
                                 st.warning("⚠️ Output file was not created. Check the command and error messages above.")
                             
-                            # Save execution log
-                            log_filename = f"execution_log_{Path(st.session_state.original_filename).stem}.txt"
-                            log_path = os.path.join(directories['logs'], log_filename)
-                            with open(log_path, 'w') as f:
-                                f.write(f"Execution log for {st.session_state.original_filename}:\n")
-                                f.write(f"Input path: {st.session_state.video_path}\n")
-                                f.write(f"Output path: {output_path}\n")
-                                f.write(f"Command: {final_command}\n")
-                                f.write(f"Return code: {result.returncode}\n")
-                                f.write(f"STDOUT:\n{result.stdout}\n")
-                                f.write(f"STDERR:\n{result.stderr}\n")
-                            
                         else:
                             st.error(f"❌ FFmpeg command failed with return code: {result.returncode}")
                             
@@ -443,13 +670,7 @@ if hasattr(st.session_state, 'ffmpeg_command'):
                             
                             if st.button("🚀 Try Simple Command", key="simple_cmd"):
                                 # Execute simple fallback command
-                                simple_result = subprocess.run(
-                                    simple_command,
-                                    shell=True,
-                                    capture_output=True,
-                                    text=True,
-                                    cwd=os.getcwd()
-                                )
+                                simple_result = run_ffmpeg(simple_command, METRICS_APP, output_path=output_path)
                                 
                                 if simple_result.returncode == 0:
                                     st.success("✅ Simple command worked! Video processed successfully.")
@@ -458,35 +679,41 @@ if hasattr(st.session_state, 'ffmpeg_command'):
                                 else:
                                     st.error(f"❌ Simple command also failed: {simple_result.stderr}")
                             
-                            # Save error log
-                            error_filename = f"error_log_{Path(st.session_state.original_filename).stem}.txt"
-                            error_path = os.path.join(directories['logs'], error_filename)
-                            with open(error_path, 'w') as f:
-                                f.write(f"Error log for {st.session_state.original_filename}:\n")
-                                f.write(f"Input path: {st.session_state.video_path}\n")
-                                f.write(f"Output path: {output_path}\n")
-                                f.write(f"Command: {final_command}\n")
-                                f.write(f"Return code: {result.returncode}\n")
-                                f.write(f"STDOUT:\n{result.stdout}\n")
-                                f.write(f"STDERR:\n{result.stderr}\n")
-                            
-                            st.write(f"📝 Error details saved to {error_path}")
+                            st.write(f"📝 Error details recorded in job ledger {get_ledger().path} (job `{render_job.job_id}`)")
                         
                 except subprocess.TimeoutExpired:
+                    render_job.error = "timeout"
                     st.error("❌ Command timed out after 5 minutes. The video may be too large or the command too complex.")
                 except Exception as e:
+                    render_job.error = str(e)
                     st.error(f"❌ Error during execution: {str(e)}")
-                    
-                    # Save exception log
-                    exception_filename = f"exception_log_{Path(st.session_state.original_filename).stem}.txt"
-                    exception_path = os.path.join(directories['logs'], exception_filename)
-                    with open(exception_path, 'w') as f:
-                        f.write(f"Exception log for {st.session_state.original_filename}:\n")
-                        f.write(f"Input path: {st.session_state.video_path}\n")
-                        f.write(f"Command: {final_command}\n")
-                        f.write(f"Exception: {str(e)}\n")
-                    
-                    st.write(f"📝 Exception details saved to {exception_path}")
+                    st.write(f"📝 Exception details recorded in job ledger {get_ledger().path} (job `{render_job.job_id}`)")
+                finally:
+                    get_ledger().append(render_job)
+
+# Cut review: thumbnails and waveform with the proposed cuts, without streaming the video
+if hasattr(st.session_state, 'ffmpeg_command'):
+    st.header("🧭 Cut Review Timeline")
+    try:
+        if st.session_state.get("prefetch") is not None:
+            st.session_state.prefetch.wait("timeline")
+        timeline = build_timeline(st.session_state.video_path, app=METRICS_APP)
+        cuts = cut_segments(edited_command, timeline["duration"])
+        
+        st.altair_chart(
+            waveform_chart(load_peaks(timeline), timeline["duration"], cuts),
+            use_container_width=True
+        )
+        st.image(
+            render_sprite_with_cuts(timeline, cuts),
+            caption=f"One thumbnail every {timeline['interval']:g}s, red = removed by the command above"
+        )
+        if cuts:
+            st.write("**Removed ranges:** " + ", ".join(f"{start:.1f}s–{end:.1f}s" for start, end in cuts))
+        else:
+            st.info("The command doesn't remove any time ranges that could be detected.")
+    except Exception as e:
+        st.warning(f"⚠️ Timeline unavailable: {e}")
 
 # Footer
 st.markdown("---")
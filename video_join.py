@@ -0,0 +1,190 @@
+"""
+Join several clips into one timeline.
+
+Clips are probed in parallel. When every clip shares the same codec
+parameters they are concatenated with the concat demuxer and `-c copy`
+(no decode/encode). Otherwise only the clips that differ from the most
+common parameter set are re-encoded, in parallel, and then the whole set is
+stream-copied together.
+"""
+
+import json
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from ffmpeg_runner import run_ffmpeg
+
+# Encoders used to re-create a reference codec when normalizing
+VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265", "vp9": "libvpx-vp9", "mpeg4": "mpeg4"}
+AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "opus": "libopus"}
+X264_PROFILES = {"baseline", "main", "high", "high10", "high422", "high444"}
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class JoinError(Exception):
+    """Raised when clips can't be probed, normalized or concatenated"""
+
+
+def probe_clip(path):
+    """Return the stream parameters that must match for a stream-copy concat"""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries",
+         "stream=codec_type,codec_name,profile,width,height,pix_fmt,r_frame_rate,time_base,sample_rate,channels"
+         ":format=duration",
+         "-of", "json", path],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise JoinError(f"ffprobe failed for {path}: {result.stderr.strip()}")
+
+    data = json.loads(result.stdout or "{}")
+    video = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), None)
+    audio = next((s for s in data.get("streams", []) if s.get("codec_type") == "audio"), None)
+    if video is None:
+        raise JoinError(f"No video stream in {path}")
+
+    signature = {
+        "video_codec": video.get("codec_name"),
+        "profile": video.get("profile"),
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "pix_fmt": video.get("pix_fmt"),
+        "frame_rate": video.get("r_frame_rate"),
+        "time_base": video.get("time_base"),
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "sample_rate": audio.get("sample_rate") if audio else None,
+        "channels": audio.get("channels") if audio else None,
+    }
+    return {
+        "path": path,
+        "duration": float(data.get("format", {}).get("duration") or 0),
+        "signature": signature,
+    }
+
+
+def probe_clips(paths, max_workers=DEFAULT_WORKERS):
+    """Probe all clips concurrently, preserving order"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(probe_clip, paths))
+
+
+def reference_signature(probes):
+    """The parameter set shared by most clips (ties go to the earliest clip)"""
+    keys = [tuple(sorted(p["signature"].items())) for p in probes]
+    counts = Counter(keys)
+    best = max(keys, key=lambda key: (counts[key], -keys.index(key)))
+    return dict(best)
+
+
+def build_normalize_command(src, dst, reference, has_audio=True):
+    """
+    FFmpeg command that re-encodes src to match the reference parameters.
+    A clip without audio gets a silent track when the reference has one, so every concat input has the same streams.
+    """
+    video_encoder = VIDEO_ENCODERS.get(reference["video_codec"])
+    if video_encoder is None:
+        raise JoinError(f"Don't know how to encode {reference['video_codec']}")
+
+    frame_rate = reference["frame_rate"]
+    timescale = reference["time_base"].split("/")[-1] if reference.get("time_base") else None
+    add_silence = bool(reference.get("audio_codec")) and not has_audio
+    args = ["ffmpeg", "-y", "-i", src]
+    if add_silence:
+        args += ["-f", "lavfi", "-i", f"anullsrc=sample_rate={reference['sample_rate']}",
+                 "-map", "0:v:0", "-map", "1:a:0", "-shortest"]
+    args += [
+        "-vf", f"scale={reference['width']}:{reference['height']}:force_original_aspect_ratio=decrease,"
+               f"pad={reference['width']}:{reference['height']}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={frame_rate}",
+        "-c:v", video_encoder,
+    ]
+    if reference.get("pix_fmt"):
+        args += ["-pix_fmt", reference["pix_fmt"]]
+    profile = (reference.get("profile") or "").lower().replace("constrained ", "").replace(" ", "")
+    if video_encoder == "libx264" and profile in X264_PROFILES:
+        args += ["-profile:v", profile]
+    if timescale:
+        args += ["-video_track_timescale", timescale]
+
+    if reference.get("audio_codec"):
+        audio_encoder = AUDIO_ENCODERS.get(reference["audio_codec"])
+        if audio_encoder is None:
+            raise JoinError(f"Don't know how to encode {reference['audio_codec']}")
+        args += ["-c:a", audio_encoder, "-ar", str(reference["sample_rate"]), "-ac", str(reference["channels"])]
+    else:
+        args += ["-an"]
+
+    args.append(dst)
+    return shlex.join(args)
+
+
+def parse_concat_list(path):
+    """Read clip paths from an ffmpeg concat list such as videos.txt"""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    clips = []
+    with open(path) as f:
+        for line in f:
+            match = re.match(r"\s*file\s+'(.*)'\s*$", line) or re.match(r"\s*file\s+(\S+)\s*$", line)
+            if match:
+                clip = match.group(1).replace("'\\''", "'")
+                clips.append(clip if os.path.isabs(clip) else os.path.join(base_dir, clip))
+    return clips
+
+
+def _write_concat_list(paths, list_path):
+    with open(list_path, "w") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+
+def join_clips(paths, output_path, app, max_workers=DEFAULT_WORKERS, work_dir=None, job=None):
+    """
+    Join clips into output_path.
+    Returns a summary dict: fast_path, normalized clips, reference signature and total duration.
+    """
+    if len(paths) < 2:
+        raise JoinError("Need at least two clips to join")
+
+    probes = probe_clips(paths, max_workers=max_workers)
+    reference = reference_signature(probes)
+    mismatched = [(i, p) for i, p in enumerate(probes) if p["signature"] != reference]
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        concat_inputs = [p["path"] for p in probes]
+
+        if mismatched:
+            def normalize(item):
+                index, probe = item
+                dst = os.path.join(tmp_dir, f"normalized_{index}{os.path.splitext(output_path)[1] or '.mp4'}")
+                has_audio = probe["signature"]["audio_codec"] is not None
+                command = build_normalize_command(probe["path"], dst, reference, has_audio)
+                result = run_ffmpeg(command, app, output_path=dst)
+                if result.returncode != 0:
+                    raise JoinError(f"Normalizing {probe['path']} failed: {result.stderr[-500:]}")
+                return index, dst
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for index, dst in executor.map(normalize, mismatched):
+                    concat_inputs[index] = dst
+
+        list_path = os.path.join(tmp_dir, "concat.txt")
+        _write_concat_list(concat_inputs, list_path)
+        command = shlex.join(["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", output_path])
+        result = run_ffmpeg(command, app, output_path=output_path, job=job)
+        if result.returncode != 0:
+            raise JoinError(f"Concat failed: {result.stderr[-500:]}")
+
+    return {
+        "output_path": output_path,
+        "fast_path": not mismatched,
+        "normalized": [p["path"] for _, p in mismatched],
+        "reference": reference,
+        "duration": sum(p["duration"] for p in probes),
+    }